@@ -0,0 +1,162 @@
+import ast
+import re
+from fractions import Fraction
+from math import isqrt
+
+import mpmath
+
+# Защита от огромных степеней: 2**10**9 не должен подвесить процесс.
+# 13000 бит ≈ 3900 цифр — меньше предела int -> str в Python (4300 цифр)
+MAX_EXPONENT = 10000
+MAX_RESULT_BITS = 13000
+# Порядок результата, который еще оцениваем приближенно (10**10**10 — да, 10**10**20 — нет)
+MAX_APPROXIMATE_EXPONENT = 10 ** 15
+APPROXIMATE_DIGITS = 15
+
+# Запись после smart_preprocess, которую понимает только быстрый путь
+SQRT_NUMBER_RE = re.compile(r'sqrt(\d+)')
+ABS_PIPES_RE = re.compile(r'abs(?!\()(.+?)abs(?!\()')
+
+
+class Unsupported(Exception):
+    """Выражение не чистая арифметика — нужен sympy"""
+
+
+class TooLarge(Exception):
+    """Точный результат слишком велик; sympy с ним тоже не справится"""
+
+
+def _sqrt(value: Fraction) -> Fraction:
+    if value < 0:
+        raise Unsupported("sqrt of negative")
+    num, den = isqrt(value.numerator), isqrt(value.denominator)
+    if num * num != value.numerator or den * den != value.denominator:
+        raise Unsupported("irrational sqrt")
+    return Fraction(num, den)
+
+
+FUNCTIONS = {"sqrt": _sqrt, "abs": abs}
+
+
+def _power(base: Fraction, exponent: Fraction) -> Fraction:
+    if exponent.denominator != 1:
+        raise Unsupported("fractional exponent")
+    exponent = exponent.numerator
+    if base == 0 and exponent < 0:
+        raise Unsupported("division by zero")
+    if abs(base) == 1 or base == 0:
+        # 1**10**10 считается мгновенно
+        return base ** exponent
+    bits = max(base.numerator.bit_length(), base.denominator.bit_length())
+    if abs(exponent) > MAX_EXPONENT or bits * abs(exponent) > MAX_RESULT_BITS:
+        raise TooLarge("result too large")
+    return base ** exponent
+
+
+def _approximate_power(base, exponent):
+    if exponent != int(exponent):
+        raise Unsupported("fractional exponent")
+    if base == 0 and exponent < 0:
+        raise Unsupported("division by zero")
+    if abs(base) not in (0, 1) and abs(exponent * mpmath.log(abs(base), 2)) > MAX_APPROXIMATE_EXPONENT:
+        raise TooLarge("result too large to estimate")
+    return base ** exponent
+
+
+def _approximate_sqrt(value):
+    if value < 0:
+        raise Unsupported("sqrt of negative")
+    return mpmath.sqrt(value)
+
+
+APPROXIMATE_FUNCTIONS = {"sqrt": _approximate_sqrt, "abs": abs}
+
+
+def _eval(node, number=Fraction, power=_power, functions=FUNCTIONS):
+    """Значение дерева: точно (Fraction) или приближенно (number=mpmath.mpf)"""
+    if isinstance(node, ast.Expression):
+        return _eval(node.body, number, power, functions)
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return number(node.value)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        value = _eval(node.operand, number, power, functions)
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp):
+        left = _eval(node.left, number, power, functions)
+        right = _eval(node.right, number, power, functions)
+        if isinstance(node.op, ast.Add):
+            return left + right
+        if isinstance(node.op, ast.Sub):
+            return left - right
+        if isinstance(node.op, ast.Mult):
+            return left * right
+        if isinstance(node.op, ast.Div):
+            if right == 0:
+                raise Unsupported("division by zero")
+            return left / right
+        if isinstance(node.op, ast.Pow):
+            return power(left, right)
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in functions
+            and len(node.args) == 1 and not node.keywords):
+        return functions[node.func.id](_eval(node.args[0], number, power, functions))
+    # Переменные, дроби с точкой, прочие функции и конструкции
+    raise Unsupported(type(node).__name__)
+
+
+def _parse(text: str):
+    text = text.replace('−', '-')
+    text = SQRT_NUMBER_RE.sub(r'sqrt(\1)', text)
+    text = ABS_PIPES_RE.sub(r'abs(\1)', text)
+    return ast.parse(text, mode='eval')
+
+
+def _has_huge_power(tree) -> bool:
+    """Есть ли в выражении числовая степень с результатом больше MAX_RESULT_BITS"""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+            try:
+                _eval(node)
+            except TooLarge:
+                return True
+            except (Unsupported, RecursionError, MemoryError):
+                pass
+    return False
+
+
+def unevaluated(text: str):
+    """Выражение как написано, без вычисления (для результатов, которые не вычислить)"""
+    import sympy as sp
+    return sp.sympify(ast.unparse(_parse(text)), evaluate=False)
+
+
+def evaluate_exact(text: str):
+    """Точное значение арифметического выражения (Fraction) или None.
+
+    TooLarge — результат или числовая степень в выражении больше MAX_RESULT_BITS.
+    """
+    try:
+        tree = _parse(text)
+        value = _eval(tree)
+    except Unsupported:
+        # "x + 10**10**10": sympy на такой степени тоже зависнет
+        if _has_huge_power(tree):
+            raise TooLarge("result too large")
+        return None
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        return None
+    # Произведения допустимых степеней тоже могут выйти за предел
+    if max(value.numerator.bit_length(), value.denominator.bit_length()) > MAX_RESULT_BITS:
+        raise TooLarge("result too large")
+    return value
+
+
+def evaluate_approximate(text: str):
+    """Приближенное значение (mpmath.mpf, APPROXIMATE_DIGITS цифр) для слишком больших результатов или None.
+
+    TooLarge — порядок результата больше MAX_APPROXIMATE_EXPONENT.
+    """
+    try:
+        with mpmath.workdps(APPROXIMATE_DIGITS):
+            return _eval(_parse(text), mpmath.mpf, _approximate_power, APPROXIMATE_FUNCTIONS)
+    except (Unsupported, SyntaxError, ValueError, ZeroDivisionError, RecursionError, MemoryError):
+        return None
@@ -0,0 +1,124 @@
+"""Пакетное решение выражений без Telegram.
+
+Читает выражения построчно из файла или stdin: JSON-объект с полем
+"expression" (и необязательным "id"), JSON-строка или просто текст.
+Выражения решаются в пуле процессов на всех ядрах, результаты пишутся
+в JSONL по мере готовности в порядке входа. В памяти держится только
+окно из нескольких задач на процесс, поэтому размер входа не важен.
+
+    python batch.py homework.jsonl -o answers.jsonl
+    cat examples.txt | python batch.py --timeout 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+
+from solver import MathSolver, SOLVE_TIMEOUT, solve_in_worker
+from solver_pool import SolverPool, SolverTimeout
+
+logger = logging.getLogger(__name__)
+
+
+def parse_line(line: str, number: int):
+    """Строка входа -> (id, выражение) или None для пустой строки"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return number, line
+    if isinstance(item, dict):
+        return item.get("id", number), str(item.get("expression", ""))
+    return number, str(item)
+
+
+def make_record(item_id, expression: str, task_type: str, result_data: dict, elapsed: float, timeout: bool) -> dict:
+    """Строка выхода: результат, шаги, тип задачи, время и признак таймаута"""
+    return {
+        "id": item_id,
+        "expression": expression,
+        "task_type": task_type,
+        "success": bool(result_data.get("success")),
+        "result": str(result_data["result"]) if result_data.get("success") else None,
+        "steps": result_data.get("steps", []),
+        "timings": result_data.get("timings", {}),
+        "elapsed": round(elapsed, 6),
+        "timeout": timeout,
+    }
+
+
+async def solve_one(pool, solver, item_id, expression: str, timeout: float) -> dict:
+    task_type = solver.cache_key(expression)[1]
+    started = time.perf_counter()
+    try:
+        result_data = await pool.solve(expression, timeout)
+        timed_out = False
+    except SolverTimeout:
+        result_data, timed_out = {"success": False, "steps": []}, True
+    except Exception as e:
+        logger.error(f"Batch solve error: {e}")
+        result_data, timed_out = {"success": False, "steps": []}, False
+    return make_record(item_id, expression, task_type, result_data, time.perf_counter() - started, timed_out)
+
+
+async def run_batch(source, sink, workers: int, timeout: float, window: int):
+    """Поток строк source -> пул процессов -> JSONL в sink"""
+    pool = SolverPool(solve_in_worker, size=workers, timeout=timeout)
+    pool.start()
+    solver = MathSolver()
+    pending = deque()
+    solved = timeouts = 0
+    try:
+        number = 0
+        while True:
+            line = await asyncio.to_thread(source.readline)
+            if line:
+                number += 1
+                parsed = parse_line(line, number)
+                if parsed:
+                    pending.append(asyncio.create_task(solve_one(pool, solver, *parsed, timeout)))
+            # Пишем готовые результаты по порядку и держим окно ограниченным
+            while pending and (pending[0].done() or len(pending) >= window or not line):
+                record = await pending.popleft()
+                sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+                sink.flush()
+                solved += 1
+                timeouts += record["timeout"]
+            if not line:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        pool.stop()
+    logger.info(f"✅ Решено {solved} выражений, таймаутов: {timeouts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", nargs="?", help="входной файл (по умолчанию stdin)")
+    parser.add_argument("-o", "--output", help="выходной JSONL (по умолчанию stdout)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 2, help="число процессов")
+    parser.add_argument("--timeout", type=float, default=SOLVE_TIMEOUT, help="секунд на выражение")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO, stream=sys.stderr)
+
+    source = open(args.input, encoding="utf-8") if args.input else sys.stdin
+    sink = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        asyncio.run(run_batch(source, sink, args.workers, args.timeout, window=args.workers * 4))
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            sink.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Доля попаданий в кэш решений: текстовый ключ против канонического.
+
+Проигрывает поток запросов через ResultCache того же размера, что у бота,
+и сравнивает ключи cache_key (текст после предобработки) и canonical_key
+(дерево выражения). Поток берется из базы истории бота (--history), из
+файла с выражениями (--input, формат как у batch.py) или генерируется:
+примеры корпуса, которые разные ученики записывают по-разному.
+
+    python benchmarks/cache_key_bench.py --history history.db
+    python benchmarks/cache_key_bench.py --requests 20000
+"""
+import argparse
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from batch import parse_line
+from canonical import canonical_key
+from corpus import build_corpus
+from result_cache import ResultCache
+from solver import MathSolver
+
+
+def load_history(path: str) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute("SELECT expression FROM history ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def load_input(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        parsed = (parse_line(line, number) for number, line in enumerate(f, 1))
+        return [expression for _, expression in filter(None, parsed)]
+
+
+def rewrite(message: str, rng) -> str:
+    """Та же задача в другой записи: пробелы, степени, порядок слагаемых, буква"""
+    choice = rng.randrange(6)
+    if choice == 1:
+        return message.replace(" ", "")
+    if choice == 2:
+        return re.sub(r'\s*([+\-*/=])\s*', r' \1 ', message)
+    if choice == 3:
+        return message.replace("**2", "²").replace("^2", "²").replace("**3", "³")
+    if choice == 4 and " + " in message and "(" not in message:
+        terms = message.split(" + ")
+        rng.shuffle(terms)
+        return " + ".join(terms)
+    if choice == 5 and not re.search(r'diff|integrate|limit|=|производн|интеграл|предел|dx', message):
+        return re.sub(r'\bx\b', rng.choice("tyz"), message)
+    return message
+
+
+def generated_traffic(size: int, seed: int) -> list:
+    """Поток запросов: популярные задачи повторяются (как в классе), записи различаются"""
+    rng = random.Random(seed)
+    corpus = build_corpus(seed=seed)
+    weights = [1 / (rank + 1) for rank in range(len(corpus))]
+    return [rewrite(message, rng) for message in rng.choices(corpus, weights, k=size)]
+
+
+def replay(messages: list, key_func, cache_size: int) -> dict:
+    cache = ResultCache(max_size=cache_size, ttl=0)
+    keys = set()
+    started = time.perf_counter()
+    for message in messages:
+        key = key_func(message)
+        keys.add(key)
+        if cache.get(key) is None:
+            cache.put(key, True)
+    elapsed = time.perf_counter() - started
+    return {
+        "hit_ratio": cache.hits / len(messages),
+        "unique_keys": len(keys),
+        "us_per_request": elapsed / len(messages) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", help="база истории бота (HISTORY_DB)")
+    parser.add_argument("--input", help="файл с выражениями (JSONL или текст)")
+    parser.add_argument("--requests", type=int, default=10000, help="размер сгенерированного потока")
+    parser.add_argument("--seed", type=int, default=1, help="seed генератора")
+    parser.add_argument("--cache-size", type=int, default=int(os.getenv("RESULT_CACHE_SIZE", 1000)))
+    args = parser.parse_args()
+
+    if args.history:
+        messages, source = load_history(args.history), args.history
+    elif args.input:
+        messages, source = load_input(args.input), args.input
+    else:
+        messages, source = generated_traffic(args.requests, args.seed), f"генератор (seed {args.seed})"
+    if not messages:
+        sys.exit("❌ Нет запросов для проигрывания")
+
+    solver = MathSolver()
+    text_key = solver.cache_key
+    structural_key = lambda message: canonical_key(*solver.cache_key(message))[0]
+
+    print(f"Запросов: {len(messages)}, источник: {source}, размер кэша: {args.cache_size}")
+    print(f"{'ключ':<12}{'попадания':>12}{'ключей':>10}{'мкс/запрос':>14}")
+    for name, key_func in (("текст", text_key), ("канонический", structural_key)):
+        stats = replay(messages, key_func, args.cache_size)
+        print(f"{name:<12}{stats['hit_ratio']:>11.1%}{stats['unique_keys']:>10}{stats['us_per_request']:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Версионированный корпус выражений для бенчмарков.
+
+Версия меняется при любом изменении состава корпуса, чтобы результаты
+разных версий не сравнивались между собой.
+"""
+import random
+
+CORPUS_VERSION = 1
+
+# Примеры из /help
+HELP_MESSAGES = [
+    "2 + 3 × 4 ÷ 2", "x² + 3x - 4 = 0", "производная от x³ + 2x² - 1",
+    "интеграл x² dx от 0 до 1", "предел (sin x)/x при x→0", "разложить x³ - 8 на множители",
+]
+
+# Примеры из раздела «Примеры задач»
+EXAMPLE_MESSAGES = [
+    "2³ × (4 + 5) ÷ 3² + √16", "|−5| × 2 + 3⁴ ÷ 9", "(x² − 4)(x³ + 2x² - x + 3) ÷ (x − 2)",
+    "разложить x⁴ - 16 на множители", "упростить (x² + 2x + 1) ÷ (x + 1) × (x³ - 1)",
+    "производная от (x⁴ + 3x³ − 2x)²", "вторая производная sin(x) × cos(x)", "дифференциал ln(x² + 1)",
+    "интеграл 3x² + 2x - 1 dx", "∫(x³ + 2x) dx от 0 до 2", "интеграл от eˣ × sin(x) dx",
+    "предел (1 - cos x)/x² при x→0", "lim x→∞ (1 + 1/x)ˣ", "предел (x² - 4)/(x - 2) при x→2",
+]
+
+# Подсказки кнопки «Решить пример»
+SOLVE_EXAMPLE_MESSAGES = [
+    "2 + 3 × 4²", "производная (x³ + 2x)²", "интеграл от eˣ × sin(x) dx", "предел (1 - cos x)/x² при x→0",
+]
+
+SEED_MESSAGES = HELP_MESSAGES + EXAMPLE_MESSAGES + SOLVE_EXAMPLE_MESSAGES
+
+
+def _polynomial(rng, degree):
+    terms = []
+    for power in range(degree, -1, -1):
+        coefficient = rng.randint(-9, 9)
+        if coefficient == 0 and power != degree:
+            continue
+        coefficient = coefficient or 1
+        if power == 0:
+            terms.append(f"{coefficient}")
+        elif power == 1:
+            terms.append(f"{coefficient}*x")
+        else:
+            terms.append(f"{coefficient}*x**{power}")
+    return " + ".join(terms).replace("+ -", "- ")
+
+
+def polynomial_workload(rng, count):
+    messages = []
+    for _ in range(count):
+        poly = _polynomial(rng, rng.randint(2, 6))
+        messages.append(rng.choice([
+            poly,
+            f"{poly} = 0",
+            f"разложить {poly}",
+            f"раскрыть ({_polynomial(rng, 2)})*({_polynomial(rng, 2)})",
+            f"diff({poly}, x)",
+            f"integrate({poly}, x)",
+        ]))
+    return messages
+
+
+def trig_workload(rng, count):
+    messages = []
+    for _ in range(count):
+        a, b = rng.randint(1, 5), rng.randint(1, 5)
+        messages.append(rng.choice([
+            f"sin({a}*x)**2 + cos({a}*x)**2",
+            f"diff(sin({a}*x)*cos({b}*x), x)",
+            f"diff(tan({a}*x)*exp({b}*x), x)",
+            f"integrate(sin({a}*x)*cos({b}*x), x)",
+            f"integrate(x*sin({a}*x), x)",
+            f"limit(sin({a}*x)/x, x, 0)",
+            f"limit((1 - cos({a}*x))/x**2, x, 0)",
+        ]))
+    return messages
+
+
+def rational_workload(rng, count):
+    messages = []
+    for _ in range(count):
+        r = rng.randint(1, 6)
+        num, den = _polynomial(rng, rng.randint(1, 3)), _polynomial(rng, rng.randint(1, 2))
+        messages.append(rng.choice([
+            f"(x**2 - {r * r})/(x - {r})",
+            f"({num})/({den}) + 1/(x + {r})",
+            f"diff(({num})/({den}), x)",
+            f"integrate(1/(x**2 + {r}), x)",
+            f"integrate(({num})/(x + {r}), x)",
+            f"limit(({num})/({den}), x, oo)",
+        ]))
+    return messages
+
+
+def build_corpus(version=CORPUS_VERSION, per_workload=30, seed=1) -> list:
+    """Примеры бота плюс сгенерированные полиномиальные, тригонометрические и рациональные задачи"""
+    if version != CORPUS_VERSION:
+        raise ValueError(f"Unknown corpus version: {version}")
+    rng = random.Random(seed)
+    return (
+        list(SEED_MESSAGES)
+        + polynomial_workload(rng, per_workload)
+        + trig_workload(rng, per_workload)
+        + rational_workload(rng, per_workload)
+    )
@@ -0,0 +1,127 @@
+"""Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Отдает боту обновления через getUpdates и принимает его ответы
+(sendMessage, editMessageText, sendChatAction, answerCallbackQuery);
+остальные методы отвечают true. Бот направляется сюда переменной
+TELEGRAM_API_URL, сеть не нужна.
+"""
+import asyncio
+import itertools
+import json
+import time
+
+import tornado.web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Math Genius", "username": "math_genius_load_bot"}
+
+
+class BotAPIHandler(tornado.web.RequestHandler):
+    """/bot<token>/<method>: параметры из формы, JSON или строки запроса"""
+
+    def initialize(self, api):
+        self.api = api
+
+    def _params(self) -> dict:
+        if self.request.headers.get("Content-Type", "").startswith("application/json") and self.request.body:
+            return json.loads(self.request.body)
+        return {name: self.get_argument(name) for name in self.request.arguments}
+
+    async def post(self, token, method):
+        result = await self.api.call(method, self._params())
+        self.set_header("Content-Type", "application/json")
+        self.write(json.dumps({"ok": True, "result": result}))
+
+    get = post
+
+
+class FakeBotAPI:
+    """Очередь обновлений для бота и журнал его ответов.
+
+    on_reply(method, chat_id, params, received) вызывается на каждый ответ бота.
+    """
+
+    def __init__(self, on_reply=None):
+        self.on_reply = on_reply
+        self.updates = []
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.new_updates = asyncio.Event()
+        self.polled = asyncio.Event()
+        self.closed = False
+        self.calls = {}
+
+    def app(self):
+        return tornado.web.Application([(r"/bot([^/]+)/(\w+)", BotAPIHandler, {"api": self})])
+
+    def message(self, chat_id: int, text: str, sender: dict = None) -> dict:
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": sender or BOT_USER,
+            "text": text,
+        }
+
+    def push(self, kind: str, payload: dict) -> int:
+        """Ставит обновление в очередь getUpdates; возвращает update_id"""
+        update_id = next(self.update_ids)
+        self.updates.append({"update_id": update_id, kind: payload})
+        self.new_updates.set()
+        return update_id
+
+    def push_message(self, user_id: int, text: str) -> int:
+        sender = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+        message = self.message(user_id, text, sender)
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return self.push("message", message)
+
+    def push_callback(self, user_id: int, data: str, message: dict) -> int:
+        return self.push("callback_query", {
+            "id": str(next(self.update_ids)),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "chat_instance": str(user_id),
+            "message": message,
+            "data": data,
+        })
+
+    def close(self):
+        """Завершает ожидающие getUpdates перед остановкой сервера"""
+        self.closed = True
+        self.new_updates.set()
+
+    async def get_updates(self, params: dict) -> list:
+        self.polled.set()
+        offset = int(params.get("offset") or 0)
+        # Подтвержденные ботом обновления больше не нужны
+        self.updates = [update for update in self.updates if update["update_id"] >= offset]
+        if not self.updates and not self.closed:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit") or 100)
+        return self.updates[:limit]
+
+    async def call(self, method: str, params: dict):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "getUpdates":
+            return await self.get_updates(params)
+        if method == "getMe":
+            return {**BOT_USER, "can_join_groups": True, "can_read_all_group_messages": False,
+                    "supports_inline_queries": True}
+
+        received = time.perf_counter()
+        chat_id = int(params["chat_id"]) if params.get("chat_id") else None
+        result = True
+        if method == "sendMessage":
+            result = self.message(chat_id, params.get("text", ""))
+        elif method == "editMessageText" and chat_id is not None:
+            result = {**self.message(chat_id, params.get("text", "")), "message_id": int(params["message_id"])}
+        if method in ("sendMessage", "editMessageText") and params.get("reply_markup"):
+            markup = params["reply_markup"]
+            result["reply_markup"] = json.loads(markup) if isinstance(markup, str) else markup
+        if self.on_reply and method not in ("deleteWebhook", "setWebhook", "close", "logOut"):
+            self.on_reply(method, chat_id, params, received, result)
+        return result
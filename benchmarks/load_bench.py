@@ -0,0 +1,242 @@
+"""Сквозной нагрузочный тест бота через заглушку Bot API.
+
+Запускает bot.py (polling) против локальной заглушки из fake_bot_api.py и
+имитирует тысячи пользователей: каждый пишет примеры из корпуса, жмет
+/start и кнопки последнего сообщения бота, ждет ответа и «думает» перед
+следующим действием. Проходит весь стек Application и обработчиков
+(start, handle_message, button_handler), решатель, кэш и планировщик.
+
+Сообщает обновления в секунду и распределение задержки от обновления до
+первого ответа бота и до окончательного (сообщение с клавиатурой), а
+также итоги решений (успех, ограничение частоты, перегрузка, таймаут).
+
+    python benchmarks/load_bench.py --users 2000 --duration 60
+    python benchmarks/load_bench.py --users 500 --env REPLY_MODE=single --output load.json
+
+С --external бот не запускается: заглушка слушает --port, а бот
+запускается вручную с TELEGRAM_API_URL=http://127.0.0.1:<port>.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import build_corpus
+from fake_bot_api import FakeBotAPI
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot.py")
+BOT_TOKEN = "123456:LOADTEST"
+
+# Доля действий пользователя: сообщение с примером, /start, кнопка
+ACTION_WEIGHTS = {"message": 0.7, "start": 0.1, "button": 0.2}
+
+# Окончательный ответ на пример по первому символу текста
+OUTCOMES = {"🎉": "success", "❌": "failure", "🐢": "rate_limited", "🚦": "overloaded", "⏳": "timeout"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list, share: float) -> float:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def distribution(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None,
+    }
+
+
+class Pending:
+    """Обновление, на которое пользователь ждет ответа"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.sent = time.perf_counter()
+        self.first = None
+        self.done = asyncio.get_running_loop().create_future()
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.corpus = build_corpus(seed=args.seed)
+        self.api = FakeBotAPI(on_reply=self.on_reply)
+        self.pending = {}
+        self.results = []
+        self.lost = 0
+        self.started = None
+
+    def on_reply(self, method, chat_id, params, received, result):
+        pending = self.pending.get(chat_id)
+        if pending is None or method not in ("sendMessage", "editMessageText"):
+            return
+        if pending.first is None:
+            pending.first = received
+        # Окончательный ответ каждого обработчика приходит с клавиатурой
+        if params.get("reply_markup") and not pending.done.done():
+            pending.done.set_result((received, params.get("text", ""), result))
+
+    def choose_action(self, rng, last_message):
+        if last_message is None:
+            return "start"
+        kinds = list(ACTION_WEIGHTS)
+        return rng.choices(kinds, [ACTION_WEIGHTS[kind] for kind in kinds])[0]
+
+    def send(self, user_id: int, kind: str, rng, last_message) -> Pending:
+        pending = self.pending[user_id] = Pending(kind)
+        if kind == "start":
+            self.api.push_message(user_id, "/start")
+        elif kind == "message":
+            self.api.push_message(user_id, rng.choice(self.corpus))
+        else:
+            buttons = [button["callback_data"] for row in last_message["reply_markup"]["inline_keyboard"]
+                       for button in row if "callback_data" in button]
+            self.api.push_callback(user_id, rng.choice(buttons), last_message)
+        return pending
+
+    async def user(self, user_id: int, stop_at: float):
+        rng = random.Random(self.rng.random())
+        last_message = None
+        await asyncio.sleep(rng.uniform(0, self.args.ramp))
+        while time.perf_counter() < stop_at:
+            kind = self.choose_action(rng, last_message)
+            pending = self.send(user_id, kind, rng, last_message)
+            try:
+                received, text, message = await asyncio.wait_for(pending.done, self.args.reply_timeout)
+            except asyncio.TimeoutError:
+                self.lost += 1
+                last_message = None
+                continue
+            finally:
+                del self.pending[user_id]
+            if pending.sent >= self.started + self.args.warmup:
+                outcome = OUTCOMES.get(text[:1], "other") if kind == "message" else "ok"
+                self.results.append((kind, outcome, pending.first - pending.sent, received - pending.sent, received))
+            last_message = message
+            await asyncio.sleep(rng.expovariate(1 / self.args.think) if self.args.think else 0)
+
+    def start_bot(self, port: int):
+        env = dict(os.environ, BOT_TOKEN=BOT_TOKEN, BOT_MODE="polling",
+                   TELEGRAM_API_URL=f"http://127.0.0.1:{port}")
+        # Служебный Flask бота и самопинг — на свободном локальном порту
+        flask_port = free_port()
+        env.update(PORT=str(flask_port), RENDER_EXTERNAL_URL=f"http://127.0.0.1:{flask_port}")
+        for item in self.args.env:
+            name, _, value = item.partition("=")
+            env[name] = value
+        log = open(self.args.bot_log, "w") if self.args.bot_log else subprocess.DEVNULL
+        return subprocess.Popen([sys.executable, BOT_SCRIPT], env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    async def run(self) -> dict:
+        port = self.args.port or free_port()
+        server = self.api.app().listen(port, address="127.0.0.1")
+        bot_process = None if self.args.external else self.start_bot(port)
+        try:
+            print(f"Заглушка Bot API: http://127.0.0.1:{port}, ждем бота...")
+            await asyncio.wait_for(self.api.polled.wait(), self.args.startup_timeout)
+            print(f"Бот подключился: {self.args.users} пользователей, {self.args.duration} сек "
+                  f"(прогрев {self.args.warmup} сек)")
+            self.started = time.perf_counter()
+            stop_at = self.started + self.args.duration
+            await asyncio.gather(*(self.user(user_id, stop_at) for user_id in range(1000, 1000 + self.args.users)))
+            measured = time.perf_counter() - self.started - self.args.warmup
+        finally:
+            if bot_process:
+                bot_process.terminate()
+                try:
+                    await asyncio.to_thread(bot_process.wait, 15)
+                except subprocess.TimeoutExpired:
+                    bot_process.kill()
+            self.api.close()
+            await asyncio.sleep(0.1)
+            server.stop()
+        return self.report(measured)
+
+    def report(self, measured: float) -> dict:
+        report = {
+            "users": self.args.users,
+            "duration": self.args.duration,
+            "warmup": self.args.warmup,
+            "updates": len(self.results),
+            "updates_per_second": len(self.results) / measured if measured > 0 else None,
+            "lost": self.lost,
+            "api_calls": self.api.calls,
+            "kinds": {},
+        }
+        for kind in ACTION_WEIGHTS:
+            rows = [row for row in self.results if row[0] == kind]
+            outcomes = {}
+            for row in rows:
+                outcomes[row[1]] = outcomes.get(row[1], 0) + 1
+            report["kinds"][kind] = {
+                "first_reply": distribution([row[2] for row in rows]),
+                "final_reply": distribution([row[3] for row in rows]),
+                "outcomes": outcomes,
+            }
+        return report
+
+
+def print_report(report: dict):
+    print(f"\nОбновлений: {report['updates']}, {report['updates_per_second']:.1f} в секунду; "
+          f"без ответа: {report['lost']}")
+    print(f"{'действие':<10}{'ответ':<12}{'кол-во':>8}{'p50, мс':>10}{'p90, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for kind, stats in report["kinds"].items():
+        for name in ("first_reply", "final_reply"):
+            row = stats[name]
+            if not row["count"]:
+                continue
+            cells = "".join(f"{row[key] * 1000:>10.0f}" for key in ("p50", "p90", "p99", "max"))
+            print(f"{kind:<10}{'первый' if name == 'first_reply' else 'итоговый':<12}{row['count']:>8}{cells}")
+    outcomes = report["kinds"]["message"]["outcomes"]
+    if outcomes:
+        print("Итоги примеров: " + ", ".join(f"{name} {count}" for name, count in sorted(outcomes.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000, help="число одновременных пользователей")
+    parser.add_argument("--duration", type=float, default=60, help="длительность теста, сек")
+    parser.add_argument("--warmup", type=float, default=5, help="первые секунды не входят в статистику")
+    parser.add_argument("--ramp", type=float, default=5, help="пользователи подключаются в течение, сек")
+    parser.add_argument("--think", type=float, default=3, help="средняя пауза пользователя между действиями, сек")
+    parser.add_argument("--reply-timeout", type=float, default=60, help="ответа дольше считаются потерянными")
+    parser.add_argument("--startup-timeout", type=float, default=120, help="ожидание запуска бота, сек")
+    parser.add_argument("--seed", type=int, default=1, help="seed генератора")
+    parser.add_argument("--port", type=int, help="порт заглушки (по умолчанию свободный)")
+    parser.add_argument("--external", action="store_true", help="не запускать бота, ждать подключения")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="переменная окружения бота")
+    parser.add_argument("--bot-log", help="файл для вывода бота")
+    parser.add_argument("--output", help="JSON с результатами")
+    args = parser.parse_args()
+    if args.external and not args.port:
+        parser.error("--external требует --port")
+
+    report = asyncio.run(LoadTest(args).run())
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Результаты записаны в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Офлайн-бенчмарк конвейера решения с замером этапов.
+
+Вызывает MathBot.solve_expression и format_result напрямую, без Telegram,
+на версионированном корпусе из corpus.py. Для каждого типа задачи
+сообщает время этапов (smart_preprocess, detect_task_type, safe_sympify,
+solve, simplify, pretty, format_result) и пишет результаты в JSON, который
+можно сравнить с сохраненным baseline.
+
+    python benchmarks/pipeline_bench.py --output bench.json
+    python benchmarks/pipeline_bench.py --output new.json --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+import sympy as sp
+from sympy.core.cache import clear_cache
+
+import bot
+import solver
+import stages
+from corpus import CORPUS_VERSION, build_corpus
+from derivatives import DERIVATIVE_CACHE
+
+STAGES = ["smart_preprocess", "detect_task_type", "safe_sympify", "solve", "simplify", "pretty", "format_result"]
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_once(math_bot, expression: str, warm: bool) -> dict:
+    """Один прогон выражения; возвращает время этапов и итог"""
+    if not warm:
+        solver.parse_cached.cache_clear()
+        solver.pretty_cached.cache_clear()
+        DERIVATIVE_CACHE.entries.clear()
+        clear_cache()
+    started = time.perf_counter()
+    with stages.request() as timings:
+        result = math_bot.solve_expression(expression, deadline=float('inf'))
+        with stages.stage("format_result"):
+            math_bot.format_result(result, expression, 0)
+    return {
+        "total": time.perf_counter() - started,
+        "stages": timings.as_dict(),
+        "success": result["success"],
+    }
+
+
+def summarize(values: list) -> dict:
+    return {
+        "median_ms": round(statistics.median(values) * 1000, 4),
+        "p90_ms": round(percentile(values, 0.9) * 1000, 4),
+        "total_ms": round(sum(values) * 1000, 4),
+    }
+
+
+def run_benchmark(corpus: list, repeat: int, warm: bool) -> dict:
+    math_bot = bot.MathBot()
+    # Первый вызов pretty и парсера прогревает импорты sympy
+    math_bot.format_result(math_bot.solve_expression("x**2 + 1"), "x**2 + 1", 0)
+
+    samples = {}
+    for expression in corpus:
+        task_type = math_bot.cache_key(expression)[1]
+        group = samples.setdefault(task_type, {"count": 0, "success": 0, "total": [], "stages": {s: [] for s in STAGES}})
+        for _ in range(repeat):
+            run = run_once(math_bot, expression, warm)
+            group["total"].append(run["total"])
+            for name in STAGES:
+                group["stages"][name].append(run["stages"].get(name, 0.0))
+        group["count"] += 1
+        group["success"] += int(run["success"])
+
+    return {
+        task_type: {
+            "count": group["count"],
+            "success": group["success"],
+            "total": summarize(group["total"]),
+            "stages": {name: summarize(values) for name, values in group["stages"].items()},
+        }
+        for task_type, group in sorted(samples.items())
+    }
+
+
+def print_report(results: dict, baseline: dict = None):
+    header = f"{'тип':<12}{'этап':<18}{'медиана, мс':>14}{'p90, мс':>12}"
+    if baseline:
+        header += f"{'baseline':>12}{'Δ':>9}"
+    print(header)
+    for task_type, group in results.items():
+        rows = [("total", group["total"])] + list(group["stages"].items())
+        for name, summary in rows:
+            line = f"{task_type:<12}{name:<18}{summary['median_ms']:>14.3f}{summary['p90_ms']:>12.3f}"
+            base_group = (baseline or {}).get(task_type)
+            if base_group:
+                base = base_group["total"] if name == "total" else base_group["stages"].get(name)
+                if base and base["median_ms"]:
+                    ratio = summary["median_ms"] / base["median_ms"]
+                    line += f"{base['median_ms']:>12.3f}{ratio:>8.2f}x"
+            print(line)
+        print(f"{'':<12}успешно {group['success']} из {group['count']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_results.json", help="куда записать JSON")
+    parser.add_argument("--baseline", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--repeat", type=int, default=3, help="прогонов на выражение")
+    parser.add_argument("--per-workload", type=int, default=30, help="выражений в каждой генерируемой нагрузке")
+    parser.add_argument("--seed", type=int, default=1, help="seed генератора корпуса")
+    parser.add_argument("--warm", action="store_true", help="не сбрасывать кэши между прогонами")
+    args = parser.parse_args()
+
+    corpus = build_corpus(per_workload=args.per_workload, seed=args.seed)
+    results = run_benchmark(corpus, args.repeat, args.warm)
+
+    report = {
+        "corpus_version": CORPUS_VERSION,
+        "corpus_size": len(corpus),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "warm": args.warm,
+        "python": platform.python_version(),
+        "sympy": sp.__version__,
+        "timestamp": datetime.now().isoformat(),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline_report = json.load(f)
+        if (baseline_report["corpus_version"], baseline_report["seed"]) != (CORPUS_VERSION, args.seed):
+            sys.exit("❌ Baseline снят на другом корпусе")
+        baseline = baseline_report["results"]
+    print_report(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
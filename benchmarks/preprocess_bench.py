@@ -0,0 +1,149 @@
+"""Дифференциальная проверка и микро-бенчмарк smart_preprocess.
+
+Сравнивает предкомпилированную предобработку из solver.py с прежней
+реализацией (последовательные re.sub/replace) на большом корпусе сообщений:
+сначала результаты должны совпасть символ в символ, затем замеряется
+стоимость обработки одного сообщения.
+
+    python benchmarks/preprocess_bench.py --size 20000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from solver import MathSolver
+from corpus import SEED_MESSAGES
+
+
+def legacy_smart_preprocess(text: str) -> str:
+    """Прежняя реализация smart_preprocess — эталон для сравнения"""
+    original_text = text
+    text = text.lower().strip()
+
+    remove_words = ['пожалуйста', 'мне', 'нужно', 'найти', 'можно', 'ли', 'ты', 'вы', 'сможешь']
+    for word in remove_words:
+        text = re.sub(r'\b' + re.escape(word) + r'\b', '', text)
+
+    math_commands = {
+        'реши': '', 'решить': '', 'посчитай': '', 'вычисли': '',
+        'производная': 'diff', 'производную': 'diff', 'дифференциал': 'diff', 'дифференцируй': 'diff',
+        'интеграл': 'integrate', 'интеграла': 'integrate', 'интегрируй': 'integrate',
+        'предел': 'limit', 'лимит': 'limit',
+        'упростить': 'simplify', 'упрости': 'simplify',
+        'разложи': 'factor', 'разложить': 'factor', 'факторизуй': 'factor',
+        'раскрой': 'expand', 'раскрыть': 'expand',
+        'уравнение': 'solve', 'реши уравнение': 'solve', 'найди корни': 'solve',
+        'от': ' ', 'по': ' ', 'для': ' ', 'переменной': ' ',
+        'при': ',', 'стремится': ',', 'стремиться': ',',
+        '→': ',', '->': ',',
+        'бесконечность': 'oo', 'бесконечности': 'oo'
+    }
+    for rus, eng in math_commands.items():
+        text = text.replace(rus, eng)
+
+    text = re.sub(r'(\d+)²', r'\1**2', text)
+    text = re.sub(r'(\d+)³', r'\1**3', text)
+    text = re.sub(r'(\d+)⁴', r'\1**4', text)
+    text = re.sub(r'(\w+)²', r'\1**2', text)
+    text = re.sub(r'(\w+)³', r'\1**3', text)
+    text = re.sub(r'(\w+)⁴', r'\1**4', text)
+
+    text = text.replace('^', '**')
+    text = text.replace('×', '*').replace('÷', '/').replace('⋅', '*')
+    text = text.replace('√', 'sqrt').replace('∣', 'abs').replace('|', 'abs')
+    text = text.replace('π', 'pi').replace('∞', 'oo').replace('∫', 'integrate')
+    text = text.replace('е', 'e').replace('ё', 'e')
+    text = text.replace('sin', 'sin').replace('cos', 'cos').replace('tan', 'tan')
+    text = text.replace('ln', 'log').replace('lg', 'log10')
+
+    if 'limit' not in text and ('стремится' in original_text or '→' in original_text or 'при' in original_text):
+        if 'x→' in text or 'x->' in text:
+            parts = re.split(r'x[→->]', text)
+            if len(parts) == 2:
+                func = parts[0].strip()
+                point = parts[1].strip()
+                text = f'limit({func}, x, {point})'
+
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.sub(r',\s*,', ',', text)
+
+    return text if text else original_text
+
+
+# Словарь для генерации сообщений: слова запроса, команды и фрагменты формул
+WORDS = [
+    "пожалуйста", "мне", "нужно", "найти", "можно", "ли", "ты", "вы", "сможешь",
+    "реши", "решить", "посчитай", "вычисли", "производная", "производную", "дифференциал",
+    "дифференцируй", "интеграл", "интеграла", "интегрируй", "предел", "лимит", "упростить",
+    "упрости", "разложи", "разложить", "факторизуй", "раскрой", "раскрыть", "уравнение",
+    "найди корни", "от", "по", "для", "переменной", "при", "стремится", "стремиться",
+    "бесконечность", "бесконечности", "до", "на", "множители", "пример", "вторая", "Реши",
+    "ПРОИЗВОДНАЯ", "Сможешь", "ещё", "число",
+]
+FORMULAS = [
+    "x²", "x³", "x⁴", "2²", "3³", "10⁴", "2²²", "x²³", "(x+1)²", "√16", "√x", "|x|", "∣-3∣",
+    "π", "∞", "∫", "x^2", "2^10", "3×4", "8÷2", "2⋅x", "ln(x)", "lg(100)", "sin(x)", "cos x",
+    "tan(x)", "eˣ", "е", "ё", "x→0", "x->oo", "x→∞", "dx", "1/x", "(1 + 1/x)", "x", "y", "z",
+    "12", "3.5", "=", "+", "-", "−", "*", "/", "(", ")", ",",
+]
+SEPARATORS = [" ", " ", " ", "  ", ", ", "\t", " (", ") "]
+
+
+def build_corpus(size: int, seed: int) -> list:
+    """Корпус: примеры бота плюс случайные сообщения из словаря"""
+    rng = random.Random(seed)
+    corpus = list(SEED_MESSAGES)
+    while len(corpus) < size:
+        parts = [rng.choice(WORDS if rng.random() < 0.4 else FORMULAS) for _ in range(rng.randint(1, 12))]
+        message = parts[0]
+        for part in parts[1:]:
+            message += rng.choice(SEPARATORS) + part
+        corpus.append(message)
+    return corpus
+
+
+def per_message_cost(func, corpus: list, repeat: int) -> float:
+    """Лучшее из repeat прогонов, в микросекундах на сообщение"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in corpus:
+            func(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=20000, help="размер корпуса")
+    parser.add_argument("--seed", type=int, default=1, help="seed генератора")
+    parser.add_argument("--repeat", type=int, default=3, help="число прогонов")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.size, args.seed)
+    compiled = MathSolver().smart_preprocess
+
+    mismatches = [m for m in corpus if compiled(m) != legacy_smart_preprocess(m)]
+    if mismatches:
+        for message in mismatches[:10]:
+            print(f"MISMATCH {message!r}: {compiled(message)!r} != {legacy_smart_preprocess(message)!r}")
+        print(f"❌ {len(mismatches)} из {len(corpus)} сообщений обработаны иначе")
+        sys.exit(1)
+    print(f"✅ {len(corpus)} сообщений: результаты совпадают")
+
+    legacy_cost = per_message_cost(legacy_smart_preprocess, corpus, args.repeat)
+    compiled_cost = per_message_cost(compiled, corpus, args.repeat)
+    print(f"legacy:   {legacy_cost:8.2f} мкс/сообщение")
+    print(f"compiled: {compiled_cost:8.2f} мкс/сообщение  (x{legacy_cost / compiled_cost:.1f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,15 +2,29 @@ import os
 import logging
 import asyncio
 import requests
-import re
+import time
 from datetime import datetime
 from flask import Flask
 from threading import Thread
 
-import sympy as sp
-from sympy import pretty, symbols, solve, integrate, diff, limit, simplify, factor, expand, series, apart, sqrt, sin, cos, tan, log, exp, pi, E, oo
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler, ContextTypes
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup,
+    InlineQueryResultArticle, InlineQueryResultsButton, InputTextMessageContent
+)
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler, InlineQueryHandler, ContextTypes
+)
+
+from canonical import canonical_key, rename_result
+from history import create_history
+from memory import rss_bytes
+from metrics import REGISTRY, CONTENT_TYPE
+from result_cache import create_result_cache
+from slowlog import SLOW_REQUEST_THRESHOLD, log_slow_request
+from scheduler import SolveScheduler, SingleFlight, RateLimited, Overloaded
+from solver import MathSolver, SOLVE_TIMEOUT, render, solve_in_worker
+from solver_pool import SolverPool, SolverTimeout
+from webhook_server import serve_webhook
 
 # Настройка логирования
 logging.basicConfig(
@@ -20,21 +34,198 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Глобальные переменные
-USER_HISTORY = {}
 app = Flask(__name__)
 
-class MathBot:
-    def __init__(self, token):
+# История решений: memory (по умолчанию) или sqlite
+USER_HISTORY = create_history(os.getenv("HISTORY_BACKEND", "memory"), os.getenv("HISTORY_DB", "history.db"))
+
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 32))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Другой адрес Bot API: свой сервер или заглушка нагрузочного теста (benchmarks/load_bench.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# Настройки решателя: process — пул процессов, inline — поток текущего процесса
+SOLVER_MODE = os.getenv("SOLVER_MODE", "process")
+SOLVER_WORKERS = int(os.getenv("SOLVER_WORKERS", os.cpu_count() or 2))
+# user — задачи пользователя всегда в одном процессе (по порядку), none — в любой свободный
+SOLVER_SHARDING = os.getenv("SOLVER_SHARDING", "user")
+
+# Планировщик: лимит запросов на пользователя и размер общей очереди
+USER_RATE = float(os.getenv("USER_RATE", 0.5))
+USER_BURST = int(os.getenv("USER_BURST", 5))
+SOLVE_QUEUE_SIZE = int(os.getenv("SOLVE_QUEUE_SIZE", 100))
+
+# Ответы: progressive — заглушка сразу и шаги по мере решения, single — один ответ в конце
+REPLY_MODE = os.getenv("REPLY_MODE", "progressive")
+# Telegram ограничивает частоту правок сообщения — не чаще раза в интервал
+PROGRESS_EDIT_INTERVAL = float(os.getenv("PROGRESS_EDIT_INTERVAL", 1.5))
+
+# Inline-режим (@bot 2x+3=7): ждем паузу в наборе, решаем только дешевое и быстро
+INLINE_DEBOUNCE = float(os.getenv("INLINE_DEBOUNCE", 0.6))
+INLINE_TIMEOUT = float(os.getenv("INLINE_TIMEOUT", 1.5))
+INLINE_MAX_COST = int(os.getenv("INLINE_MAX_COST", 40))
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 3600))
+INLINE_TASKS = {"general", "equation", "derivative", "factor", "expand"}
+
+# Кэш решений: ключ — каноническое дерево запроса и тип задачи.
+# memory — в процессе (с файлом-снимком), sqlite — общий для всех экземпляров на машине
+RESULT_CACHE = create_result_cache(
+    os.getenv("RESULT_CACHE_BACKEND", "memory"),
+    max_size=int(os.getenv("RESULT_CACHE_SIZE", 1000)),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", 86400)),
+    path=os.getenv("RESULT_CACHE_FILE"),
+    db_path=os.getenv("RESULT_CACHE_DB", "cache.db")
+)
+
+# Неизменные части ответа собираются один раз
+RESPONSE_HEADER = "🎉 *Великолепно! Решение готово:*\n\n"
+RESPONSE_FOOTER = "\n✨ *Магия математики завершена!*"
+PROGRESS_HEADER = "⏳ *Решаю...*\n\n"
+FAILURE_RESPONSE = (
+    "❌ *Пример не понятен*\n\n"
+    "💡 *Попробуйте:*\n"
+    "• Сформулировать иначе\n• Использовать примеры из раздела помощи\n• Проверить синтаксис\n\n"
+    "🎯 *Я понимаю самые сложные примеры, но нужно правильное оформление!*"
+)
+
+TASK_SOLVERS = {
+    "derivative": "solve_advanced_derivative",
+    "integral": "solve_advanced_integral",
+    "limit": "solve_advanced_limit",
+    "equation": "solve_advanced_equation",
+    "factor": "solve_factorization",
+    "expand": "solve_expansion",
+    "general": "solve_advanced_general"
+}
+
+# Метрики для /metrics
+REQUESTS = REGISTRY.counter("mathbot_requests_total", "Запросы на решение по типу задачи", ["task_type"])
+REQUEST_LATENCY = REGISTRY.histogram(
+    "mathbot_request_duration_seconds", "Время ответа на запрос (с учетом кэша и очереди)", ["task_type"]
+)
+SOLVER_RESULTS = REGISTRY.counter("mathbot_solver_results_total", "Итоги работы решателей", ["solver", "outcome"])
+INLINE_QUERIES = REGISTRY.counter("mathbot_inline_queries_total", "Inline-запросы по итогу", ["outcome"])
+REJECTED = REGISTRY.counter("mathbot_rejected_total", "Запросы, отклоненные планировщиком", ["reason"])
+REGISTRY.callback("mathbot_result_cache_hits_total", "Попадания в кэш решений", lambda: RESULT_CACHE.hits, kind="counter")
+REGISTRY.callback("mathbot_result_cache_misses_total", "Промахи кэша решений", lambda: RESULT_CACHE.misses, kind="counter")
+REGISTRY.callback("mathbot_result_cache_hit_ratio", "Доля попаданий в кэш решений", lambda: RESULT_CACHE.stats()["hit_ratio"])
+REGISTRY.callback("mathbot_result_cache_size", "Записей в кэше решений", lambda: len(RESULT_CACHE.entries))
+REGISTRY.callback("mathbot_process_rss_bytes", "RSS процесса бота", rss_bytes)
+
+class ProgressReply:
+    """Сообщение-заглушка, которое дописывается шагами решения"""
+
+    def __init__(self, message, interval: float):
+        self.message = message
+        self.interval = interval
+        self.steps = []
+        self.shown = 0
+        # Первая правка не раньше интервала: быстрые решения обходятся одной правкой
+        self.last_edit = time.monotonic()
+        self.pending = None
+        # Правки идут по одной: отправленную промежуточную нельзя отменить,
+        # окончательная ждет ее, а после нее промежуточных уже не бывает
+        self.edit_lock = asyncio.Lock()
+        self.finished = False
+
+    def add(self, step: str):
+        """Новый шаг; правка сообщения откладывается до конца интервала"""
+        self.steps.append(step)
+        if self.pending is None and not self.finished:
+            self.pending = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        try:
+            await asyncio.sleep(max(0.0, self.last_edit + self.interval - time.monotonic()))
+            async with self.edit_lock:
+                self.pending = None
+                if self.finished or self.shown == len(self.steps):
+                    return
+                self.shown = len(self.steps)
+                self.last_edit = time.monotonic()
+                text = PROGRESS_HEADER + "".join(f"• {step}\n" for step in self.steps)
+                await self.message.edit_text(text, parse_mode='Markdown')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Progress edit error: {e}")
+
+    async def finish(self, text: str, reply_markup):
+        """Заменяет заглушку окончательным ответом"""
+        self.finished = True
+        if self.pending and not self.edit_lock.locked():
+            # Правка еще не начата: ждать конца интервала незачем
+            self.pending.cancel()
+        async with self.edit_lock:
+            try:
+                await self.message.edit_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+            except Exception as e:
+                # Заглушку могли удалить — отвечаем новым сообщением
+                logger.error(f"Progress finish error: {e}")
+                await self.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+
+class MathBot(MathSolver):
+    def __init__(self, token=None):
         self.token = token
-        self.application = Application.builder().token(token).build()
-        self.setup_handlers()
+        self.solver_pool = None
+        self.scheduler = SolveScheduler(
+            self.run_solver,
+            # При шардинге часть задач ждет занятый процесс своего шарда — берем с запасом
+            concurrency=SOLVER_WORKERS * (2 if SOLVER_SHARDING == "user" else 1),
+            max_queue=SOLVE_QUEUE_SIZE,
+            user_rate=USER_RATE,
+            user_burst=USER_BURST
+        )
+        # Один и тот же пример от целого класса решается один раз
+        self.inflight = SingleFlight()
+        # Последний inline-запрос каждого пользователя (более ранние устарели)
+        self.inline_latest = {}
+        # Без токена бот работает только как решатель
+        self.application = None
+        if token:
+            builder = Application.builder().token(token).concurrent_updates(UPDATE_CONCURRENCY)
+            if TELEGRAM_API_URL:
+                builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+            if BOT_MODE == "webhook":
+                # Обновления приходят через наш HTTP-сервер, Updater не нужен
+                builder = builder.updater(None)
+            # Обработчики очереди останавливаем, пока event loop polling еще работает
+            builder = builder.post_shutdown(self.post_shutdown)
+            self.application = builder.build()
+            self.setup_handlers()
+            self.setup_metrics()
     
+    def setup_metrics(self):
+        """Метрики очереди и пула процессов этого экземпляра"""
+        REGISTRY.callback("mathbot_solve_queue_depth", "Задач в очереди планировщика", lambda: self.scheduler.depth)
+        REGISTRY.callback("mathbot_solver_running", "Задач в работе у решателей", lambda: self.scheduler.running)
+        REGISTRY.callback(
+            "mathbot_solver_pool_utilization", "Доля занятых процессов пула",
+            lambda: self.solver_pool.utilization() if self.solver_pool else None
+        )
+        REGISTRY.callback(
+            "mathbot_singleflight_shared_total", "Запросы, дождавшиеся уже идущего решения того же примера",
+            lambda: self.inflight.shared, kind="counter"
+        )
+        REGISTRY.callback(
+            "mathbot_solver_worker_rss_bytes", "RSS процессов-решателей",
+            lambda: self.solver_pool.rss() if self.solver_pool else None, ["worker"]
+        )
+        REGISTRY.callback(
+            "mathbot_solver_worker_recycles_total", "Плановые перезапуски процессов-решателей",
+            lambda: self.solver_pool.recycles() if self.solver_pool else None, ["reason"], kind="counter"
+        )
+
     def setup_handlers(self):
         """Настройка обработчиков"""
         self.application.add_handler(CommandHandler("start", self.start))
         self.application.add_handler(CommandHandler("help", self.help_command))
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
         self.application.add_handler(CallbackQueryHandler(self.button_handler))
+        self.application.add_handler(InlineQueryHandler(self.inline_query))
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
@@ -102,11 +293,18 @@ class MathBot:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(
-            help_text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        if update.callback_query:
+            await update.callback_query.edit_message_text(
+                help_text,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
+        else:
+            await update.message.reply_text(
+                help_text,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
 
     async def show_examples(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать примеры задач"""
@@ -191,428 +389,126 @@ class MathBot:
             parse_mode='Markdown'
         )
 
-    def smart_preprocess(self, text: str) -> str:
-        """Умная предварительная обработка с улучшенным пониманием"""
-        original_text = text
-        text = text.lower().strip()
-        
-        # Удаляем лишние слова
-        remove_words = ['пожалуйста', 'мне', 'нужно', 'найти', 'можно', 'ли', 'ты', 'вы', 'сможешь']
-        for word in remove_words:
-            text = re.sub(r'\b' + re.escape(word) + r'\b', '', text)
-        
-        # Замена русских команд на математические
-        math_commands = {
-            'реши': '', 'решить': '', 'посчитай': '', 'вычисли': '', 
-            'производная': 'diff', 'производную': 'diff', 'дифференциал': 'diff', 'дифференцируй': 'diff',
-            'интеграл': 'integrate', 'интеграла': 'integrate', 'интегрируй': 'integrate',
-            'предел': 'limit', 'лимит': 'limit',
-            'упростить': 'simplify', 'упрости': 'simplify',
-            'разложи': 'factor', 'разложить': 'factor', 'факторизуй': 'factor',
-            'раскрой': 'expand', 'раскрыть': 'expand',
-            'уравнение': 'solve', 'реши уравнение': 'solve', 'найди корни': 'solve',
-            'от': ' ', 'по': ' ', 'для': ' ', 'переменной': ' ',
-            'при': ',', 'стремится': ',', 'стремиться': ',',
-            '→': ',', '->': ',',
-            'бесконечность': 'oo', 'бесконечности': 'oo'
-        }
-        
-        for rus, eng in math_commands.items():
-            text = text.replace(rus, eng)
-        
-        # Умная замена математических обозначений
-        text = re.sub(r'(\d+)²', r'\1**2', text)
-        text = re.sub(r'(\d+)³', r'\1**3', text)
-        text = re.sub(r'(\d+)⁴', r'\1**4', text)
-        text = re.sub(r'(\w+)²', r'\1**2', text)
-        text = re.sub(r'(\w+)³', r'\1**3', text)
-        text = re.sub(r'(\w+)⁴', r'\1**4', text)
-        
-        text = text.replace('^', '**')
-        text = text.replace('×', '*').replace('÷', '/').replace('⋅', '*')
-        text = text.replace('√', 'sqrt').replace('∣', 'abs').replace('|', 'abs')
-        text = text.replace('π', 'pi').replace('∞', 'oo').replace('∫', 'integrate')
-        text = text.replace('е', 'e').replace('ё', 'e')
-        text = text.replace('sin', 'sin').replace('cos', 'cos').replace('tan', 'tan')
-        text = text.replace('ln', 'log').replace('lg', 'log10')
-        
-        # Обработка пределов с естественным языком
-        limit_pattern = r'limit\(([^,]+),([^,]+),([^)]+)\)'
-        if 'limit' not in text and ('стремится' in original_text or '→' in original_text or 'при' in original_text):
-            # Автоматическое создание limit из естественного языка
-            if 'x→' in text or 'x->' in text:
-                parts = re.split(r'x[→->]', text)
-                if len(parts) == 2:
-                    func = parts[0].strip()
-                    point = parts[1].strip()
-                    text = f'limit({func}, x, {point})'
-        
-        # Обработка интегралов с пределами
-        if 'integrate' in text and ('от' in original_text or 'до' in original_text):
-            if 'от' in original_text and 'до' in original_text:
-                # Извлекаем пределы интегрирования
-                pass
-        
-        # Удаление лишних пробелов и очистка
-        text = re.sub(r'\s+', ' ', text).strip()
-        text = re.sub(r',\s*,', ',', text)  # Удаляем лишние запятые
-        
-        return text if text else original_text
-
-    def safe_sympify(self, expr_str: str):
-        """Безопасное преобразование строки в sympy выражение"""
-        try:
-            # Создаем безопасное окружение для sympify
-            safe_dict = {
-                'x': symbols('x'), 'y': symbols('y'), 'z': symbols('z'),
-                'sin': sin, 'cos': cos, 'tan': tan, 'cot': lambda x: 1/tan(x),
-                'sqrt': sqrt, 'log': log, 'ln': log, 'exp': exp,
-                'pi': pi, 'e': E, 'oo': oo,
-                'abs': abs, 'factorial': sp.factorial,
-                'diff': diff, 'integrate': integrate, 'limit': limit,
-                'solve': solve, 'simplify': simplify, 'factor': factor, 'expand': expand
-            }
-            
-            # Заменяем ** на ^ для временного парсинга
-            temp_expr = expr_str.replace('**', '^')
-            expr = sp.sympify(temp_expr, locals=safe_dict)
-            # Возвращаем обратно **
-            return expr
-        except Exception as e:
-            logger.error(f"Sympify error: {e}")
-            return None
-
-    def solve_expression(self, expression: str) -> dict:
-        """Умное решение математического выражения с улучшенным пониманием"""
+    async def solve_async(self, expression: str, user_id: int = None, on_step=None) -> dict:
+        """Решение вне event loop: кэш, общее решение одинаковых примеров, затем очередь планировщика"""
+        started = time.perf_counter()
+        clean_expr, task_type = self.cache_key(expression)
+        key, names = canonical_key(clean_expr, task_type)
+        REQUESTS.inc(task_type)
+        outcome, result_data = "error", None
         try:
-            steps = []
-            original_expr = expression
-            
-            # Умная предобработка
-            clean_expr = self.smart_preprocess(expression)
-            steps.append(f"🎯 *Запрос:* `{original_expr}`")
-            
-            # Определяем тип задачи
-            task_type = self.detect_task_type(clean_expr, original_expr)
-            steps.append(f"🔍 *Определяем тип задачи...*")
-            
-            # Пробуем разные методы решения
-            result = None
-            
-            if task_type == "derivative":
-                result = self.solve_advanced_derivative(clean_expr, steps)
-            elif task_type == "integral":
-                result = self.solve_advanced_integral(clean_expr, steps)
-            elif task_type == "limit":
-                result = self.solve_advanced_limit(clean_expr, steps)
-            elif task_type == "equation":
-                result = self.solve_advanced_equation(clean_expr, steps)
-            elif task_type == "factor":
-                result = self.solve_factorization(clean_expr, steps)
-            elif task_type == "expand":
-                result = self.solve_expansion(clean_expr, steps)
-            else:
-                result = self.solve_advanced_general(clean_expr, steps)
-            
-            if result and result["success"]:
-                return result
-            else:
-                return {
-                    "success": False,
-                    "error": "Не удалось распознать пример",
-                    "steps": ["❌ *Пример не понятен*", "💡 Попробуйте сформулировать иначе"]
-                }
-                
-        except Exception as e:
-            logger.error(f"Solution error: {e}")
-            return {
-                "success": False,
-                "error": "Не удалось обработать запрос",
-                "steps": ["❌ *Пример не понятен*", "🎯 Попробуйте изменить формулировку"]
-            }
-
-    def detect_task_type(self, clean_expr: str, original_expr: str) -> str:
-        """Определение типа математической задачи"""
-        original_lower = original_expr.lower()
-        
-        if any(word in original_lower for word in ['производн', 'дифференциал', 'diff']):
-            return "derivative"
-        elif any(word in original_lower for word in ['интеграл', 'integrate', '∫']):
-            return "integral"
-        elif any(word in original_lower for word in ['предел', 'limit', 'стремится', '→']):
-            return "limit"
-        elif any(word in original_lower for word in ['уравнен', 'реши', 'корн', 'solve', '=']):
-            return "equation"
-        elif any(word in original_lower for word in ['разлож', 'факториз', 'factor']):
-            return "factor"
-        elif any(word in original_lower for word in ['раскр', 'expand']):
-            return "expand"
-        else:
-            return "general"
-
-    def solve_advanced_general(self, clean_expr: str, steps: list) -> dict:
-        """Решение общих математических выражений"""
-        try:
-            expr = self.safe_sympify(clean_expr)
-            if not expr:
-                return {"success": False}
-            
-            steps.append(f"📝 *Выражение:* `{pretty(expr, use_unicode=True)}`")
-            
-            # Последовательное упрощение
-            result = expr
-            simplified = simplify(expr)
-            
-            if simplified != expr:
-                steps.append(f"✨ *Упрощаем:* `{pretty(simplified, use_unicode=True)}`")
-                result = simplified
-            
-            # Дополнительные преобразования для полиномов
-            if result.is_polynomial():
-                factored = factor(result)
-                if factored != result:
-                    steps.append(f"🧩 *Разложение:* `{pretty(factored, use_unicode=True)}`")
-                    result = factored
-            
-            return {
-                "success": True,
-                "result": result,
-                "steps": steps,
-                "type": "general"
-            }
-        except:
-            return {"success": False}
-
-    def solve_advanced_derivative(self, clean_expr: str, steps: list) -> dict:
-        """Решение производных с улучшенным пониманием"""
-        try:
-            x = symbols('x')
-            
-            # Извлекаем функцию из разных форматов
-            if 'diff(' in clean_expr:
-                # Формат diff(f(x), x)
-                match = re.search(r'diff\(([^,]+),([^)]+)\)', clean_expr)
-                if match:
-                    func_str = match.group(1).strip()
-                    var_str = match.group(2).strip()
-                    func = self.safe_sympify(func_str)
-                    var = self.safe_sympify(var_str) if var_str != 'x' else x
-                else:
-                    return {"success": False}
-            else:
-                # Пытаемся извлечь функцию из текста
-                func_str = clean_expr.replace('diff', '').strip()
-                func = self.safe_sympify(func_str)
-                var = x
-            
-            if not func:
-                return {"success": False}
-            
-            steps.append(f"📈 *Функция:* `{pretty(func, use_unicode=True)}`")
-            steps.append(f"🎯 *По переменной:* `{var}`")
-            
-            derivative = diff(func, var)
-            steps.append(f"💫 *Производная:* `{pretty(derivative, use_unicode=True)}`")
-            
-            simplified = simplify(derivative)
-            if simplified != derivative:
-                steps.append(f"✨ *Упрощенная:* `{pretty(simplified, use_unicode=True)}`")
-            
-            return {
-                "success": True,
-                "result": simplified,
-                "steps": steps,
-                "type": "derivative"
-            }
-        except:
-            return {"success": False}
-
-    def solve_advanced_integral(self, clean_expr: str, steps: list) -> dict:
-        """Решение интегралов с улучшенным пониманием"""
-        try:
-            x = symbols('x')
-            
-            if 'integrate(' in clean_expr:
-                match = re.search(r'integrate\(([^,]+),([^)]+)\)', clean_expr)
-                if match:
-                    func_str = match.group(1).strip()
-                    var_str = match.group(2).strip()
-                    func = self.safe_sympify(func_str)
-                    var = self.safe_sympify(var_str) if var_str != 'x' else x
-                else:
-                    return {"success": False}
-            else:
-                func_str = clean_expr.replace('integrate', '').strip()
-                func = self.safe_sympify(func_str)
-                var = x
-            
-            if not func:
-                return {"success": False}
-            
-            steps.append(f"📊 *Функция:* `{pretty(func, use_unicode=True)}`")
-            steps.append(f"🎯 *Переменная:* `{var}`")
-            
-            integral = integrate(func, var)
-            steps.append(f"💫 *Интеграл:* `{pretty(integral, use_unicode=True)}`")
-            
-            simplified = simplify(integral)
-            if simplified != integral:
-                steps.append(f"✨ *Упрощенный:* `{pretty(simplified, use_unicode=True)}`")
-            
-            return {
-                "success": True,
-                "result": simplified,
-                "steps": steps,
-                "type": "integral"
-            }
-        except:
-            return {"success": False}
-
-    def solve_advanced_equation(self, clean_expr: str, steps: list) -> dict:
-        """Решение уравнений с улучшенным пониманием"""
-        try:
-            x = symbols('x')
-            
-            if 'solve(' in clean_expr:
-                match = re.search(r'solve\(([^,]+),([^)]+)\)', clean_expr)
-                if match:
-                    eq_str = match.group(1).strip()
-                    var_str = match.group(2).strip()
-                    equation = self.safe_sympify(eq_str)
-                    var = self.safe_sympify(var_str) if var_str != 'x' else x
-                else:
-                    return {"success": False}
-            else:
-                # Пытаемся найти уравнение в тексте
-                if '=' in clean_expr:
-                    parts = clean_expr.split('=')
-                    if len(parts) == 2:
-                        left = self.safe_sympify(parts[0].strip())
-                        right = self.safe_sympify(parts[1].strip())
-                        equation = left - right
-                    else:
-                        return {"success": False}
-                else:
-                    equation = self.safe_sympify(clean_expr)
-                var = x
-            
-            if not equation:
-                return {"success": False}
-            
-            steps.append(f"📝 *Уравнение:* `{pretty(equation, use_unicode=True)} = 0`")
-            
-            solutions = solve(equation, var)
-            
-            if solutions:
-                steps.append(f"💡 *Найдено решений:* {len(solutions)}")
-                for i, sol in enumerate(solutions, 1):
-                    steps.append(f"🔹 *x{i}:* `{pretty(sol, use_unicode=True)}`")
-            else:
-                steps.append("❌ *Решений не найдено*")
-            
-            return {
-                "success": True,
-                "result": solutions,
-                "steps": steps,
-                "type": "equation"
-            }
-        except:
-            return {"success": False}
-
-    def solve_advanced_limit(self, clean_expr: str, steps: list) -> dict:
-        """Решение пределов с улучшенным пониманием"""
-        try:
-            x = symbols('x')
-            
-            if 'limit(' in clean_expr:
-                match = re.search(r'limit\(([^,]+),([^,]+),([^)]+)\)', clean_expr)
-                if match:
-                    func_str = match.group(1).strip()
-                    var_str = match.group(2).strip()
-                    point_str = match.group(3).strip()
-                    func = self.safe_sympify(func_str)
-                    var = self.safe_sympify(var_str) if var_str != 'x' else x
-                    point = self.safe_sympify(point_str)
-                else:
-                    return {"success": False}
-            else:
-                return {"success": False}
-            
-            if not func:
-                return {"success": False}
-            
-            steps.append(f"📊 *Функция:* `{pretty(func, use_unicode=True)}`")
-            steps.append(f"🎯 *Переменная:* `{var}`")
-            steps.append(f"📍 *Точка:* `{point}`")
-            
-            lim = limit(func, var, point)
-            steps.append(f"💫 *Предел:* `{pretty(lim, use_unicode=True)}`")
-            
-            return {
-                "success": True,
-                "result": lim,
-                "steps": steps,
-                "type": "limit"
-            }
-        except:
-            return {"success": False}
-
-    def solve_factorization(self, clean_expr: str, steps: list) -> dict:
-        """Факторизация выражений"""
-        try:
-            expr = self.safe_sympify(clean_expr.replace('factor', '').strip())
-            if not expr:
-                return {"success": False}
-            
-            steps.append(f"📝 *Исходное:* `{pretty(expr, use_unicode=True)}`")
-            
-            factored = factor(expr)
-            steps.append(f"🧩 *Разложено:* `{pretty(factored, use_unicode=True)}`")
-            
-            return {
-                "success": True,
-                "result": factored,
-                "steps": steps,
-                "type": "factor"
-            }
-        except:
-            return {"success": False}
+            cached = await self.cached_result(key)
+            if cached is not None:
+                outcome = "cache"
+                # Тот же пример мог быть записан другими словами и буквами
+                return self.adapt_result(cached, names, expression)
+            
+            # Чистая арифметика решается за микросекунды прямо здесь
+            if task_type == "general":
+                result_data = self.solve_arithmetic(clean_expr, self.initial_steps(expression))
+                if result_data:
+                    outcome = "success"
+                    SOLVER_RESULTS.inc("solve_arithmetic", "success")
+                    return result_data
+            
+            solver = TASK_SOLVERS.get(task_type, task_type)
+            try:
+                result_data = await self.inflight.run(
+                    key, lambda: self.submit_named(user_id, task_type, expression, key, names, on_step)
+                )
+            except SolverTimeout:
+                SOLVER_RESULTS.inc(solver, "timeout")
+                outcome = "timeout"
+                raise
+            except RateLimited:
+                REJECTED.inc("rate_limited")
+                outcome = "rate_limited"
+                raise
+            except Overloaded:
+                REJECTED.inc("overloaded")
+                outcome = "overloaded"
+                raise
+            
+            outcome = "success" if result_data.get("success") else "failure"
+            SOLVER_RESULTS.inc(solver, outcome)
+            if result_data.get("success"):
+                # Решение могло быть общим: запрос показываем словами этого пользователя
+                return self.adapt_result(result_data, names, expression)
+            return result_data
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUEST_LATENCY.observe(elapsed, task_type)
+            if elapsed >= SLOW_REQUEST_THRESHOLD:
+                # Таймаут приходит без результата: в журнале будет только текст и время
+                result_data = result_data or {}
+                log_slow_request(
+                    expression, clean_expr, task_type, elapsed, outcome,
+                    timings=result_data.get("timings"), detail=result_data.get("detail"),
+                    profile=result_data.get("profile")
+                )
+
+    async def cached_result(self, key):
+        """Решение из кэша: память сразу, общий уровень (SQLite) — в потоке, не держа event loop"""
+        cached = RESULT_CACHE.get_local(key)
+        if cached is None and RESULT_CACHE.shared:
+            cached = await asyncio.to_thread(RESULT_CACHE.get_shared, key)
+        return cached
+
+    async def submit_named(self, user_id, task_type: str, expression: str, key, names, on_step=None) -> dict:
+        """Решение через планировщик с пометкой, для каких имен переменных оно получено.
+
+        Кэшируется здесь, в общей задаче SingleFlight: ее не отменяет ожидающий
+        с таймаутом (inline), и решение попадает в кэш, даже если ответ уже не ждут.
+        """
+        result_data = await self.scheduler.submit(user_id, task_type, expression, on_step)
+        result_data = {**result_data, "names": names}
+        if result_data.get("success"):
+            RESULT_CACHE.put(key, result_data)
+        return result_data
+
+    def adapt_result(self, result_data: dict, names, expression: str) -> dict:
+        """Готовое решение для запроса этого пользователя (его текст и его переменные)"""
+        if result_data.get("names") == names:
+            return {**result_data, "steps": [self.request_step(expression)] + result_data["steps"][1:]}
+        # Шаги уже нарисованы с чужими буквами — показываем только ответ в своих
+        result = rename_result(result_data["result"], result_data["names"], names)
+        return {
+            **result_data,
+            "result": result,
+            "answer": render(result),
+            "names": names,
+            "steps": [
+                self.request_step(expression),
+                "♻️ *Такой же пример уже решали с другими переменными — ответ в ваших обозначениях*"
+            ]
+        }
 
-    def solve_expansion(self, clean_expr: str, steps: list) -> dict:
-        """Раскрытие скобок"""
+    async def run_solver(self, expression: str, on_step=None, user_id=None) -> dict:
+        """Запуск решателя с ограничением времени"""
+        if self.solver_pool:
+            shard = user_id if SOLVER_SHARDING == "user" else None
+            return await self.solver_pool.solve(expression, on_step=on_step, shard=shard)
+        if on_step:
+            # Шаги приходят из потока решателя — передаем их в event loop
+            loop, callback = asyncio.get_running_loop(), on_step
+            on_step = lambda step: loop.call_soon_threadsafe(callback, step)
+        # В режиме inline поток нельзя прервать, поэтому только перестаем ждать
         try:
-            expr = self.safe_sympify(clean_expr.replace('expand', '').strip())
-            if not expr:
-                return {"success": False}
-            
-            steps.append(f"📝 *Исходное:* `{pretty(expr, use_unicode=True)}`")
-            
-            expanded = expand(expr)
-            steps.append(f"📤 *Раскрыто:* `{pretty(expanded, use_unicode=True)}`")
-            
-            return {
-                "success": True,
-                "result": expanded,
-                "steps": steps,
-                "type": "expand"
-            }
-        except:
-            return {"success": False}
+            return await asyncio.wait_for(
+                asyncio.to_thread(self.solve_expression, expression, None, on_step), SOLVE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            raise SolverTimeout(expression)
 
     def format_result(self, result_data: dict, expression: str, user_id: int) -> str:
         """Красивое форматирование результата"""
-        if user_id not in USER_HISTORY:
-            USER_HISTORY[user_id] = []
-        
         if result_data["success"]:
-            response = "🎉 *Великолепно! Решение готово:*\n\n"
-            
-            for step in result_data["steps"]:
-                response += f"• {step}\n"
-            
-            response += f"\n💎 *Финальный ответ:*\n"
-            response += f"```\n{pretty(result_data['result'], use_unicode=True)}\n```"
-            response += f"\n✨ *Магия математики завершена!*"
+            answer = result_data.get("answer") or render(result_data["result"])
+            parts = [RESPONSE_HEADER]
+            parts.extend(f"• {step}\n" for step in result_data["steps"])
+            parts.append(f"\n💎 *Финальный ответ:*\n```\n{answer}\n```")
+            parts.append(RESPONSE_FOOTER)
+            response = "".join(parts)
             
             # Сохраняем в историю
             history_item = {
@@ -621,15 +517,10 @@ class MathBot:
                 "result": str(result_data["result"]),
                 "type": result_data.get("type", "general")
             }
-            USER_HISTORY[user_id].append(history_item)
-            if len(USER_HISTORY[user_id]) > 20:
-                USER_HISTORY[user_id] = USER_HISTORY[user_id][-20:]
+            USER_HISTORY.add(user_id, history_item)
                 
         else:
-            response = "❌ *Пример не понятен*\n\n"
-            response += "💡 *Попробуйте:*\n"
-            response += "• Сформулировать иначе\n• Использовать примеры из раздела помощи\n• Проверить синтаксис\n\n"
-            response += "🎯 *Я понимаю самые сложные примеры, но нужно правильное оформление!*"
+            response = FAILURE_RESPONSE
         
         return response
 
@@ -638,11 +529,38 @@ class MathBot:
         user_message = update.message.text
         user_id = update.effective_user.id
         
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-        await asyncio.sleep(0.3)
+        progress = None
+        if REPLY_MODE == "progressive":
+            placeholder = await update.message.reply_text(PROGRESS_HEADER, parse_mode='Markdown')
+            progress = ProgressReply(placeholder, PROGRESS_EDIT_INTERVAL)
+        else:
+            await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
         
-        result_data = self.solve_expression(user_message)
-        response_text = self.format_result(result_data, user_message, user_id)
+        try:
+            result_data = await self.solve_async(user_message, user_id, progress.add if progress else None)
+            response_text = self.format_result(result_data, user_message, user_id)
+        except RateLimited:
+            response_text = (
+                "🐢 *Не так быстро!*\n\n"
+                "Вы отправляете примеры слишком часто.\n\n"
+                "💡 *Подождите пару секунд и попробуйте снова*"
+            )
+        except Overloaded:
+            response_text = (
+                "🚦 *Сейчас очень много задач!*\n\n"
+                "Очередь решателя заполнена.\n\n"
+                "💡 *Попробуйте отправить пример чуть позже*"
+            )
+        except SolverTimeout:
+            response_text = (
+                "⏳ *Слишком долго!*\n\n"
+                f"Пример оказался слишком сложным: я не успел решить его за {SOLVE_TIMEOUT:g} сек.\n\n"
+                "💡 *Попробуйте упростить запрос или разбить его на части*"
+            )
+        except Exception as e:
+            logger.error(f"Solver pool error: {e}")
+            result_data = {"success": False, "steps": []}
+            response_text = self.format_result(result_data, user_message, user_id)
         
         keyboard = [
             [InlineKeyboardButton("🔁 Новый пример", callback_data="solve_example")],
@@ -652,12 +570,76 @@ class MathBot:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
+        if progress:
+            await progress.finish(response_text, reply_markup)
+            return
         await update.message.reply_text(
             response_text,
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
 
+    async def inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Inline-запросы: ответ из кэша или быстрое решение после паузы в наборе"""
+        query = update.inline_query
+        expression = query.query.strip()
+        if not expression:
+            await query.answer([], cache_time=INLINE_CACHE_TIME)
+            return
+        
+        clean_expr, task_type = self.cache_key(expression)
+        key, names = canonical_key(clean_expr, task_type)
+        cached = await self.cached_result(key)
+        if cached is not None:
+            INLINE_QUERIES.inc("cached")
+            await self.answer_inline(query, expression, self.adapt_result(cached, names, expression))
+            return
+        
+        # Запрос приходит на каждое нажатие клавиши: решаем только последний
+        user_id = query.from_user.id
+        self.inline_latest[user_id] = query.id
+        await asyncio.sleep(INLINE_DEBOUNCE)
+        if self.inline_latest.get(user_id) != query.id:
+            INLINE_QUERIES.inc("superseded")
+            return
+        del self.inline_latest[user_id]
+        
+        cost = self.estimate_cost(clean_expr) if task_type in INLINE_TASKS else None
+        if cost is None or cost > INLINE_MAX_COST:
+            INLINE_QUERIES.inc("skipped")
+            await self.answer_inline(query, expression, None)
+            return
+        
+        try:
+            result_data = await asyncio.wait_for(self.solve_async(expression, user_id), INLINE_TIMEOUT)
+        except (asyncio.TimeoutError, SolverTimeout, RateLimited, Overloaded):
+            INLINE_QUERIES.inc("timeout")
+            await self.answer_inline(query, expression, None)
+            return
+        INLINE_QUERIES.inc("solved" if result_data.get("success") else "failed")
+        await self.answer_inline(query, expression, result_data)
+
+    async def answer_inline(self, query, expression: str, result_data: dict):
+        """Ответ на inline-запрос; без решения — кнопка перехода в чат с ботом"""
+        button = InlineQueryResultsButton(text="🧮 Решить подробно в чате", start_parameter="inline")
+        if not result_data or not result_data.get("success"):
+            # Неудачу кэшируем ненадолго: пользователь, скорее всего, допечатает пример
+            await query.answer([], cache_time=5, is_personal=False, button=button)
+            return
+        
+        result = result_data["result"]
+        answer = result_data.get("answer") or render(result)
+        article = InlineQueryResultArticle(
+            id=str(abs(hash(expression)))[:64],
+            title=f"{expression} ⇒ {str(result)[:100]}",
+            description="Нажмите, чтобы отправить ответ в чат",
+            input_message_content=InputTextMessageContent(
+                f"🧮 `{expression}`\n\n💎 *Ответ:*\n```\n{answer}\n```", parse_mode='Markdown'
+            )
+        )
+        # Ответ не зависит от пользователя: Telegram может отдавать его всем из своего кэша
+        await query.answer([article], cache_time=INLINE_CACHE_TIME, is_personal=False, button=button)
+
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик нажатий на инлайн кнопки"""
         query = update.callback_query
@@ -689,9 +671,10 @@ class MathBot:
             await self.about_bot(update, context)
             
         elif query.data == "history":
-            if user_id in USER_HISTORY and USER_HISTORY[user_id]:
+            history_items = await asyncio.to_thread(USER_HISTORY.recent, user_id, 10)
+            if history_items:
                 history_text = "📚 *История ваших решений:*\n\n"
-                for i, item in enumerate(reversed(USER_HISTORY[user_id][-10:]), 1):
+                for i, item in enumerate(reversed(history_items), 1):
                     emoji = "🧮" if item.get("type") == "general" else "📈" if item.get("type") == "derivative" else "∫" if item.get("type") == "integral" else "∞" if item.get("type") == "limit" else "🎯"
                     history_text += f"{emoji} *{i}.* `{item['expression'][:40]}{'...' if len(item['expression']) > 40 else ''}`\n"
                     history_text += f"   💎 `{item['result'][:50]}{'...' if len(item['result']) > 50 else ''}`\n\n"
@@ -720,8 +703,46 @@ class MathBot:
     
     def run_bot(self):
         """Запуск бота"""
+        if SOLVER_MODE == "process":
+            self.solver_pool = SolverPool(solve_in_worker, size=SOLVER_WORKERS, timeout=SOLVE_TIMEOUT)
+            self.solver_pool.start()
+        
         logger.info("🚀 Math Genius Bot запущен!")
-        self.application.run_polling()
+        try:
+            if BOT_MODE == "webhook":
+                asyncio.run(self.run_webhook())
+            else:
+                self.application.run_polling()
+        finally:
+            # Каждый шаг отдельно: ошибка одного не должна оставлять остальные ресурсы открытыми
+            cleanup = [self.scheduler.stop, RESULT_CACHE.close, USER_HISTORY.close]
+            if self.solver_pool:
+                cleanup.insert(1, self.solver_pool.stop)
+            for step in cleanup:
+                try:
+                    step()
+                except Exception as e:
+                    logger.error(f"Shutdown error: {e}")
+
+    async def post_shutdown(self, application):
+        await self.scheduler.shutdown()
+
+    async def run_webhook(self):
+        """Вебхук, /health и /ping в одном event loop с Application"""
+        app_url = os.environ.get('RENDER_EXTERNAL_URL', 'http://localhost:5000')
+        try:
+            await serve_webhook(
+                self.application,
+                {"/": home, "/health": health, "/ping": ping, "/metrics": metrics},
+                port=int(os.environ.get('PORT', 5000)),
+                url_path=WEBHOOK_PATH,
+                webhook_url=os.getenv("WEBHOOK_URL", f"{app_url}/{WEBHOOK_PATH}"),
+                secret_token=WEBHOOK_SECRET,
+                background=[ping_self_async()]
+            )
+        finally:
+            # serve_webhook не вызывает post_shutdown — останавливаем очередь сами
+            await self.scheduler.shutdown()
 
 # Flask приложение для Render
 @app.route('/')
@@ -730,13 +751,22 @@ def home():
 
 @app.route('/health')
 def health():
-    return {"status": "healthy", "service": "Math Genius Bot", "timestamp": datetime.now().isoformat()}
+    return {
+        "status": "healthy",
+        "service": "Math Genius Bot",
+        "timestamp": datetime.now().isoformat(),
+        "cache": RESULT_CACHE.stats()
+    }
 
 @app.route('/ping')
 def ping():
     logger.info(f"🏓 Пинг получен - {datetime.now()}")
     return {"status": "pong", "timestamp": datetime.now().isoformat()}
 
+@app.route('/metrics')
+def metrics():
+    return REGISTRY.render(), 200, {"Content-Type": CONTENT_TYPE}
+
 def start_flask():
     """Запуск Flask приложения"""
     port = int(os.environ.get('PORT', 5000))
@@ -754,6 +784,17 @@ def ping_self():
             logger.error(f"❌ Ошибка самопинга: {e}")
         time.sleep(300)  # Пинг каждые 5 минут
 
+async def ping_self_async():
+    """Самопинг внутри event loop (режим вебхука)"""
+    while True:
+        try:
+            app_url = os.environ.get('RENDER_EXTERNAL_URL', 'http://localhost:5000')
+            response = await asyncio.to_thread(requests.get, f"{app_url}/ping", timeout=10)
+            logger.info(f"🔔 Самопинг: {response.status_code}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка самопинга: {e}")
+        await asyncio.sleep(300)  # Пинг каждые 5 минут
+
 if __name__ == '__main__':
     BOT_TOKEN = os.getenv("BOT_TOKEN")
     
@@ -764,15 +805,17 @@ if __name__ == '__main__':
     # Создаем и запускаем бота
     bot = MathBot(BOT_TOKEN)
     
-    # Запускаем Flask в отдельном потоке
-    flask_thread = Thread(target=start_flask)
-    flask_thread.daemon = True
-    flask_thread.start()
-    
-    # Запускаем самопинг в отдельном потоке
-    ping_thread = Thread(target=ping_self)
-    ping_thread.daemon = True
-    ping_thread.start()
+    # В режиме вебхука HTTP-маршруты и самопинг работают в event loop бота
+    if BOT_MODE != "webhook":
+        # Запускаем Flask в отдельном потоке
+        flask_thread = Thread(target=start_flask)
+        flask_thread.daemon = True
+        flask_thread.start()
+        
+        # Запускаем самопинг в отдельном потоке
+        ping_thread = Thread(target=ping_self)
+        ping_thread.daemon = True
+        ping_thread.start()
     
     # Запускаем бота
     bot.run_bot()
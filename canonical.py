@@ -0,0 +1,125 @@
+"""Канонические ключи кэша: равносильные записи одной задачи дают один ключ.
+
+Ключ строится по дереву выражения без вычислений (parse_structure), а не
+по тексту: порядок слагаемых и множителей, пробелы, запись чисел и
+имена переменных на ключ не влияют. Переменные переименовываются по
+алфавиту в v0, v1, ...; x сохраняет имя там, где он переменная по
+умолчанию (производная, интеграл, предел, уравнение).
+"""
+import re
+
+import sympy as sp
+
+from solver import COMMAND_WORDS_RE, parse_structure
+
+# Разделители частей запроса: "f = g", "f, x, 0", "f dx 0 до 2"
+SEGMENT_SPLIT_RE = re.compile(r'\s*(=|,|\bдо\b|\bd[a-z]\b)\s*')
+
+# Задачи, где x — переменная по умолчанию, а не просто имя
+DEFAULT_VARIABLE_TASKS = {"derivative", "integral", "limit", "equation"}
+
+
+def _unwrap(text: str) -> str:
+    """Снимает внешние скобки, если они охватывают весь текст: "(f, x)" -> "f, x".
+
+    Пары скобок находятся за один проход: запрос приходит из event loop
+    до всех проверок размера, и повторный просмотр на каждый слой был бы O(n²).
+    """
+    pairs, stack = {}, []
+    for i, char in enumerate(text):
+        if char == '(':
+            stack.append(i)
+        elif char == ')' and stack:
+            pairs[stack.pop()] = i
+    start, end = 0, len(text) - 1
+    while start < end and text[start] == '(' and pairs.get(start) == end:
+        start, end = start + 1, end - 1
+        while start <= end and text[start].isspace():
+            start += 1
+        while end >= start and text[end].isspace():
+            end -= 1
+    return text[start:end + 1]
+
+
+def _form(expr, names: dict) -> str:
+    """Строка дерева с переименованными символами и упорядоченными аргументами"""
+    if expr.is_Symbol:
+        return names[expr]
+    if expr.is_Number:
+        return str(expr)
+    if expr.is_Add or expr.is_Mul:
+        # Дерево без вычислений не схлопывает вложенные суммы и произведения
+        args = []
+        for arg in expr.args:
+            args.extend(arg.args if arg.func is expr.func else (arg,))
+        return f"{expr.func.__name__}({','.join(sorted(_form(arg, names) for arg in args))})"
+    args = ",".join(_form(arg, names) for arg in expr.args)
+    return f"{type(expr).__name__}({args})"
+
+
+def canonical_key(clean_expr: str, task_type: str):
+    """(ключ, имена) для кэша; имена — кортеж пар (каноническое, исходное).
+
+    Если запрос не разбирается по частям, ключом остается сам текст.
+    """
+    commands = tuple(sorted(set(COMMAND_WORDS_RE.findall(clean_expr))))
+    text = _unwrap(COMMAND_WORDS_RE.sub(' ', clean_expr).strip())
+    parts = SEGMENT_SPLIT_RE.split(text)
+
+    trees, symbols, differential = [], set(), None
+    for i, part in enumerate(parts):
+        if i % 2:
+            if part.startswith('d'):
+                # dt: переменная интегрирования участвует в переименовании
+                differential = sp.Symbol(part[1:])
+                symbols.add(differential)
+                trees.append(("d", differential))
+            else:
+                trees.append(part)
+            continue
+        if not part and i == len(parts) - 1 and differential is not None and trees[-1] == ("d", differential):
+            # "f dx": после дифференциала в конце остается пустая часть
+            continue
+        expr = parse_structure(_unwrap(part)) if part else None
+        if expr is None:
+            return ("text", clean_expr, task_type), None
+        symbols |= expr.atoms(sp.Symbol)
+        trees.append(expr)
+
+    # Переменная по умолчанию — x, а если задан дифференциал, то его переменная:
+    # "3x² dx" и "3y² dy" дают один ключ
+    default = None
+    if differential is not None:
+        default = differential
+    elif task_type in DEFAULT_VARIABLE_TASKS:
+        default = sp.Symbol('x')
+    names, index = {}, 0
+    for symbol in sorted(symbols, key=lambda s: s.name):
+        if symbol == default:
+            names[symbol] = 'x'
+        else:
+            names[symbol] = f"v{index}"
+            index += 1
+
+    forms = []
+    for tree in trees:
+        if isinstance(tree, str):
+            forms.append(tree)
+        elif isinstance(tree, tuple):
+            forms.append("d" + names[tree[1]])
+        else:
+            forms.append(_form(tree, names))
+    key = (task_type, commands, " ".join(forms))
+    return key, tuple(sorted((canonical, symbol.name) for symbol, canonical in names.items()))
+
+
+def rename_result(result, source_names, target_names):
+    """Переносит ответ, найденный для одних имен переменных, на другие"""
+    source, target = dict(source_names), dict(target_names)
+    mapping = {
+        sp.Symbol(source[canonical]): sp.Symbol(target[canonical])
+        for canonical in source if source[canonical] != target.get(canonical, source[canonical])
+    }
+    if isinstance(result, list):
+        return [sp.sympify(item).xreplace(mapping) for item in result]
+    return sp.sympify(result).xreplace(mapping)
@@ -0,0 +1,177 @@
+"""Производные высших порядков и смешанные частные производные.
+
+Порядок задается словом («вторая», «третью»), записью «3-го порядка» или
+аргументами diff(f, x, 2, y), как в sympy. Производные считаются по одной
+и хранятся в кэше процесса: запрос третьей производной после второй
+продолжает с уже найденной второй.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import sympy as sp
+
+MAX_ORDER = int(os.getenv("DERIVATIVE_MAX_ORDER", 20))
+CACHE_SIZE = int(os.getenv("DERIVATIVE_CACHE_SIZE", 2048))
+
+# Основы порядковых числительных; после предобработки "е" может стать латинской "e"
+ORDINAL_STEMS = [
+    ('перв', 1), ('втор', 2), ('тр[еe]т', 3), ('ч[еe]тв', 4), ('пят', 5),
+    ('ш[еe]ст', 6), ('с[еe]дьм', 7), ('восьм', 8), ('д[еe]вят', 9), ('д[еe]сят', 10),
+]
+ORDINAL_RE = re.compile(r'\b(?:' + '|'.join(f'({stem})' for stem, _ in ORDINAL_STEMS) + r')\w*')
+# "3-го порядка": предобработка вырезает "по" из "порядка"
+ORDER_RE = re.compile(r'\b(\d+)\s*-?\s*[а-я]*\s+(?:по)?\s*рядк\w*')
+# Переменные в конце текста: "... по x и y" -> "... x и y"
+VARIABLES_RE = re.compile(r'(?<=[\w)])\s+([a-z](?:\s*(?:,|\bи\b)\s*[a-z])*)\s*$')
+VARIABLE_SPLIT_RE = re.compile(r'\s*(?:,|\bи\b)\s*')
+# Оставшиеся русские слова ("найди", "функции") в выражение не входят
+WORDS_RE = re.compile(r'\b\w*[а-яё]\w*\b')
+DIFF_CALL_RE = re.compile(r'diff\((.*)\)\s*$')
+
+SUPERSCRIPTS = str.maketrans('0123456789', '⁰¹²³⁴⁵⁶⁷⁸⁹')
+
+
+def split_arguments(text: str) -> list:
+    """Аргументы через запятую верхнего уровня: "f(a, b), x" -> ["f(a, b)", "x"]"""
+    args, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            args.append(text[start:i].strip())
+            start = i + 1
+    args.append(text[start:].strip())
+    return args
+
+
+def _order(value: int) -> int:
+    if value < 1:
+        # diff(f, x, 0) — это сама f, а не производная: отказываем явно
+        raise ValueError("порядок производной должен быть не меньше 1")
+    if value > MAX_ORDER:
+        raise ValueError(f"порядок больше {MAX_ORDER}")
+    return value
+
+
+def _call_sequence(args: list) -> list:
+    """Аргументы после функции: (x, 2, y) -> ["x", "x", "y"]"""
+    sequence = []
+    for arg in args:
+        if arg.isdigit():
+            if not sequence:
+                # diff(f, 2): по x, как для функции одной переменной
+                sequence.append('x')
+            sequence.extend(sequence[-1:] * (_order(int(arg)) - 1))
+        elif re.fullmatch(r'[a-z]', arg):
+            sequence.append(arg)
+        else:
+            raise ValueError(f"не переменная: {arg}")
+    return sequence
+
+
+def parse_request(clean_expr: str, parse):
+    """Функция и последовательность переменных дифференцирования.
+
+    parse — разбор строки в выражение (None при ошибке).
+    Возвращает (функция, кортеж символов) или None.
+    """
+    call = DIFF_CALL_RE.search(clean_expr)
+    if call:
+        args = split_arguments(call.group(1))
+        func = parse(args[0])
+        sequence = _call_sequence(args[1:]) or ['x']
+    else:
+        text = clean_expr.replace('diff', ' ')
+        order = 1
+        ordinal = ORDINAL_RE.search(text)
+        numeric = ORDER_RE.search(text)
+        if numeric:
+            order = _order(int(numeric.group(1)))
+            text = ORDER_RE.sub(' ', text)
+        elif ordinal:
+            order = ORDINAL_STEMS[ordinal.lastindex - 1][1]
+        text = ORDINAL_RE.sub(' ', text)
+
+        variables = VARIABLES_RE.search(text)
+        func = None
+        if variables:
+            names = VARIABLE_SPLIT_RE.split(variables.group(1))
+            func = parse(WORDS_RE.sub(' ', text[:variables.start()]).strip())
+            # "производная 2 x" — это 2x, а не производная 2 по x
+            if func is not None and {sp.Symbol(name) for name in names} <= func.free_symbols:
+                # Несколько переменных — смешанная производная, по каждой один раз
+                sequence = names if len(names) > 1 else names * order
+            else:
+                func = None
+        if func is None:
+            func = parse(WORDS_RE.sub(' ', text).strip())
+            sequence = ['x'] * order
+
+    if func is None or not sequence:
+        return None
+    _order(len(sequence))
+    return func, tuple(sp.Symbol(name) for name in sequence)
+
+
+def describe(sequence: tuple, partial: bool = None) -> str:
+    """(x, x, y) -> "∂³/∂x²∂y"; (x, x) -> "d²/dx²"; partial — ∂ и для одной переменной"""
+    powers = []
+    for var in sequence:
+        if powers and powers[-1][0] == var:
+            powers[-1][1] += 1
+        else:
+            powers.append([var, 1])
+    if partial is None:
+        partial = len(powers) > 1
+    mark = '∂' if partial else 'd'
+    order = str(len(sequence)).translate(SUPERSCRIPTS) if len(sequence) > 1 else ''
+    parts = ''.join(f"{mark}{var}{str(power).translate(SUPERSCRIPTS) if power > 1 else ''}" for var, power in powers)
+    return f"{mark}{order}/{parts}"
+
+
+class DerivativeCache:
+    """LRU производных по ключу (функция, последовательность переменных)"""
+
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+DERIVATIVE_CACHE = DerivativeCache()
+
+
+def derivative_chain(func, sequence: tuple) -> tuple:
+    """Производные по каждому префиксу sequence -> (список, сколько взято из кэша).
+
+    Каждый шаг — одно дифференцирование предыдущего результата без упрощения.
+    """
+    chain, reused, current = [], 0, func
+    for k in range(1, len(sequence) + 1):
+        key = (func, sequence[:k])
+        cached = DERIVATIVE_CACHE.get(key)
+        if cached is None:
+            current = sp.diff(current, sequence[k - 1])
+            DERIVATIVE_CACHE.put(key, current)
+        else:
+            current, reused = cached, k
+        chain.append(current)
+    return chain, reused
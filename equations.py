@@ -0,0 +1,113 @@
+import math
+import os
+
+import sympy as sp
+
+from timebox import BudgetExceeded, share_of_remaining, time_limit
+
+# Формулы корней используются до 4-й степени; громоздкие радикалы заменяем приближением
+EXACT_MAX_DEGREE = 4
+RADICAL_MAX_OPS = int(os.getenv("RADICAL_MAX_OPS", 16))
+ROOT_DIGITS = int(os.getenv("ROOT_DIGITS", 10))
+
+# Неполиномиальные уравнения: бюджет на sympy.solve, затем поиск смены знака
+SYMBOLIC_BUDGET = float(os.getenv("EQUATION_SYMBOLIC_BUDGET", 3))
+SCAN_RANGE = float(os.getenv("EQUATION_SCAN_RANGE", 100))
+SCAN_SAMPLES = int(os.getenv("EQUATION_SCAN_SAMPLES", 4000))
+BISECT_STEPS = 80
+RESIDUAL_TOLERANCE = 1e-6
+
+
+def _approximate(poly: sp.Poly) -> list:
+    return [sp.Float(root, ROOT_DIGITS) if root.is_real else root.evalf(ROOT_DIGITS)
+            for root in poly.nroots(n=ROOT_DIGITS + 5, maxsteps=200)]
+
+
+def _poly_roots(poly: sp.Poly) -> tuple:
+    """Корни многочлена по неприводимым множителям -> (корни, все ли точные)"""
+    roots, exact = [], True
+    for factor_poly, _ in poly.factor_list()[1]:
+        if factor_poly.degree() <= EXACT_MAX_DEGREE:
+            found = sp.roots(factor_poly, multiple=False)
+            if (sum(found.values()) == factor_poly.degree()
+                    and all(sp.count_ops(root) <= RADICAL_MAX_OPS for root in found)):
+                roots.extend(found)
+                continue
+        roots.extend(_approximate(factor_poly))
+        exact = False
+    return roots, exact
+
+
+def solve_polynomial(equation, var):
+    """Полиномиальное (или дробно-рациональное) уравнение -> (корни, точные ли); None — не многочлен"""
+    numerator, denominator = sp.fraction(sp.together(equation))
+    if not (numerator.is_polynomial(var) and denominator.is_polynomial(var)):
+        return None
+    poly = sp.Poly(numerator, var)
+    if poly.free_symbols - {var} or not poly.domain.is_Numerical:
+        # Коэффициенты с параметрами — забота sympy.solve
+        return None
+    if poly.degree() < 1:
+        return [], True
+    roots, exact = _poly_roots(poly)
+    # Коэффициенты-десятичные дроби (RR) приближенные — и корни тоже
+    exact = exact and poly.domain.is_Exact
+    if denominator.has(var):
+        # Корни знаменателя не входят в область определения
+        roots = [root for root in roots
+                 if abs(sp.N(denominator.subs(var, root))) > RESIDUAL_TOLERANCE]
+    return sorted(roots, key=sp.default_sort_key), exact
+
+
+def bracket_roots(equation, var, low: float = -SCAN_RANGE, high: float = SCAN_RANGE,
+                  samples: int = SCAN_SAMPLES) -> list:
+    """Вещественные корни на отрезке: смена знака на сетке и бисекция"""
+    func = sp.lambdify(var, equation, modules="math")
+
+    def value(point):
+        try:
+            result = float(func(point))
+        except (ValueError, ZeroDivisionError, OverflowError, TypeError):
+            return math.nan
+        return result
+
+    roots = []
+    step = (high - low) / samples
+    left, f_left = low, value(low)
+    for i in range(1, samples + 1):
+        right = low + i * step
+        f_right = value(right)
+        if f_left == 0:
+            roots.append(left)
+        elif math.isfinite(f_left) and math.isfinite(f_right) and f_left * f_right < 0:
+            a, b, f_a = left, right, f_left
+            for _ in range(BISECT_STEPS):
+                middle = (a + b) / 2
+                f_middle = value(middle)
+                if not math.isfinite(f_middle):
+                    break
+                if f_a * f_middle <= 0:
+                    b = middle
+                else:
+                    a, f_a = middle, f_middle
+            root = (a + b) / 2
+            # Смена знака через полюс (tan, 1/x) корнем не является
+            if abs(value(root)) < RESIDUAL_TOLERANCE:
+                roots.append(root)
+        left, f_left = right, f_right
+    return [sp.Float(root, ROOT_DIGITS) for root in roots]
+
+
+def find_roots(equation, var, deadline: float = None) -> tuple:
+    """Корни уравнения equation = 0 -> (корни, точные ли, способ)"""
+    polynomial = solve_polynomial(equation, var)
+    if polynomial is not None:
+        roots, exact = polynomial
+        return roots, exact, "poly"
+
+    try:
+        with time_limit(share_of_remaining(deadline, SYMBOLIC_BUDGET)):
+            return sp.solve(equation, var), True, "solve"
+    except (BudgetExceeded, NotImplementedError):
+        pass
+    return bracket_roots(equation, var), False, "numeric"
@@ -0,0 +1,122 @@
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from sqlite_writer import BatchedSQLiteWriter
+
+logger = logging.getLogger(__name__)
+
+HISTORY_LIMIT = 20
+# В памяти храним историю не более чем стольких пользователей (давно неактивные вытесняются)
+HISTORY_MAX_USERS = int(os.getenv("HISTORY_MAX_USERS", 10000))
+
+
+class MemoryHistory:
+    """История решений в памяти процесса (по умолчанию и для тестов)"""
+
+    def __init__(self, limit=HISTORY_LIMIT, max_users=HISTORY_MAX_USERS):
+        self.limit = limit
+        self.max_users = max_users
+        self.items = OrderedDict()
+
+    def add(self, user_id: int, item: dict):
+        user_items = self.items.setdefault(user_id, [])
+        self.items.move_to_end(user_id)
+        user_items.append(item)
+        if len(user_items) > self.limit:
+            del user_items[0]
+        if len(self.items) > self.max_users:
+            self.items.popitem(last=False)
+
+    def recent(self, user_id: int, count: int = 10) -> list:
+        """Последние count записей пользователя, от старых к новым"""
+        return self.items.get(user_id, [])[-count:]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteHistory:
+    """История в SQLite (WAL): запись пачками в фоновом потоке"""
+
+    def __init__(self, path: str, limit=HISTORY_LIMIT, batch_size=100):
+        self.path = path
+        self.limit = limit
+        self.read_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                timestamp TEXT NOT NULL,
+                expression TEXT NOT NULL,
+                result TEXT NOT NULL,
+                type TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS history_user ON history (user_id, id)")
+        conn.commit()
+        conn.close()
+
+        self.reader = self._connect(check_same_thread=False)
+        self.writer = BatchedSQLiteWriter(self._connect, self._write, batch_size, name="history-writer")
+
+    def _connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=check_same_thread)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # В режиме WAL synchronous=NORMAL не делает fsync на каждый commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def add(self, user_id: int, item: dict):
+        """Запись ставится в очередь и не ждет диска"""
+        self.writer.put((user_id, item["timestamp"], item["expression"], item["result"], item.get("type", "general")))
+
+    def recent(self, user_id: int, count: int = 10) -> list:
+        """Последние count записей пользователя, от старых к новым"""
+        self.flush()
+        with self.read_lock:
+            rows = self.reader.execute(
+                "SELECT timestamp, expression, result, type FROM history "
+                "WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, count)
+            ).fetchall()
+        return [
+            {"timestamp": timestamp, "expression": expression, "result": result, "type": task_type}
+            for timestamp, expression, result, task_type in reversed(rows)
+        ]
+
+    def flush(self):
+        """Дождаться записи всех поставленных в очередь элементов"""
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+        self.reader.close()
+
+    def _write(self, conn, rows):
+        with conn:
+            conn.executemany(
+                "INSERT INTO history (user_id, timestamp, expression, result, type) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            # Оставляем только последние limit записей каждого пользователя
+            for user_id in {row[0] for row in rows}:
+                conn.execute(
+                    "DELETE FROM history WHERE user_id = ? AND id <= ("
+                    "SELECT id FROM history WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (user_id, user_id, self.limit)
+                )
+
+
+def create_history(backend: str = "memory", path: str = "history.db"):
+    """Создание хранилища истории по имени бэкенда"""
+    if backend == "sqlite":
+        return SQLiteHistory(path)
+    return MemoryHistory()
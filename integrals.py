@@ -0,0 +1,59 @@
+import os
+
+import mpmath
+import sympy as sp
+
+from timebox import BudgetExceeded, share_of_remaining, time_limit
+
+# Бюджет на символьное интегрирование, затем адаптивная квадратура mpmath
+SYMBOLIC_BUDGET = float(os.getenv("INTEGRAL_SYMBOLIC_BUDGET", 3))
+QUAD_DIGITS = int(os.getenv("QUAD_DIGITS", 15))
+# Квадратуре не верим, если оценка погрешности больше этой доли значения
+QUAD_TOLERANCE = 1e-6
+# Конечный отрезок при неудаче делится на части: осциллирующие функции
+QUAD_PIECES = 32
+
+
+def _mp_bound(bound):
+    if bound == sp.oo:
+        return mpmath.inf
+    if bound == -sp.oo:
+        return -mpmath.inf
+    return mpmath.mpmathify(sp.N(bound, QUAD_DIGITS))
+
+
+def converged(value, error: float) -> bool:
+    """Оценка погрешности мала по сравнению со значением (иначе — расходится или не сошлась)"""
+    return bool(mpmath.isfinite(value)) and error <= QUAD_TOLERANCE * max(1, abs(value))
+
+
+def numeric_integral(func, var, low, high) -> tuple:
+    """Адаптивная квадратура (tanh-sinh) -> (значение, оценка погрешности, сошлась ли)"""
+    integrand = sp.lambdify(var, func, modules="mpmath")
+    with mpmath.workdps(QUAD_DIGITS):
+        low, high = _mp_bound(low), _mp_bound(high)
+        value, error = mpmath.quad(integrand, [low, high], error=True)
+        if not converged(value, error) and mpmath.isfinite(low) and mpmath.isfinite(high):
+            value, error = mpmath.quad(integrand, mpmath.linspace(low, high, QUAD_PIECES + 1), error=True)
+        return sp.sympify(value), float(error), converged(value, error)
+
+
+def definite_integral(func, var, low, high, deadline: float = None) -> dict:
+    """Определенный интеграл: sympy под бюджетом, иначе численно.
+
+    Возвращает {"value", "method": "symbolic" | "numeric", "error_estimate"}; value None —
+    квадратура не сошлась (интеграл, возможно, расходится).
+    """
+    try:
+        with time_limit(share_of_remaining(deadline, SYMBOLIC_BUDGET)):
+            value = sp.integrate(func, (var, low, high))
+        if not value.has(sp.Integral):
+            return {"value": value, "method": "symbolic", "error_estimate": None}
+    except (BudgetExceeded, NotImplementedError):
+        pass
+
+    if (func.free_symbols | low.free_symbols | high.free_symbols) - {var}:
+        # С параметрами численно не посчитать
+        return None
+    value, error, ok = numeric_integral(func, var, low, high)
+    return {"value": value if ok else None, "method": "numeric", "error_estimate": error}
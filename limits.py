@@ -0,0 +1,215 @@
+"""Пределы: sympy.limit под бюджетом, затем численная оценка.
+
+Численно функция считается (mpmath, повышенная точность) на
+последовательностях, сходящихся к точке слева и справа: a ± h/10^k или
+±X·10^k для бесконечности. Предел последовательности уточняется
+экстраполяцией Ричардсона и Δ²-процессом Эйткена; берется оценка с
+меньшей погрешностью.
+"""
+import logging
+import os
+
+import mpmath
+import sympy as sp
+
+from timebox import BudgetExceeded, share_of_remaining, time_limit
+
+logger = logging.getLogger(__name__)
+
+# Бюджет на символьный предел, затем численная оценка
+SYMBOLIC_BUDGET = float(os.getenv("LIMIT_SYMBOLIC_BUDGET", 3))
+# Шаг до 1e-12: рабочая точность с запасом на потерю разрядов при вычитании
+LIMIT_DIGITS = int(os.getenv("LIMIT_DIGITS", 50))
+SEQUENCE_TERMS = 12
+REDUCTION = 10
+FIRST_STEP = 0.1
+FIRST_FAR_POINT = 10
+# |f| на хвосте растет с каждым шагом и уже больше порога — предел бесконечен
+INFINITY_THRESHOLD = 1e3
+INFINITY_GROWTH = 1.5
+# Медленный рост (ln x): приращения на хвосте одного знака и не убывают
+SLOW_INFINITY_THRESHOLD = 10
+SLOW_GROWTH = 0.9
+# Относительная погрешность стороны, при которой предел не определяется (sin(1/x))
+UNDETERMINED_ERROR = 1e-2
+
+# Уверенность по относительной погрешности
+CONFIDENCE_LEVELS = [(1e-10, "высокая"), (1e-5, "средняя")]
+
+
+def _points(point, side: int) -> list:
+    if point == sp.oo or point == -sp.oo:
+        sign = 1 if point == sp.oo else -1
+        return [sign * mpmath.mpf(FIRST_FAR_POINT) * REDUCTION ** k for k in range(SEQUENCE_TERMS)]
+    center = mpmath.mpmathify(sp.N(point, LIMIT_DIGITS))
+    step = FIRST_STEP * max(1, abs(center))
+    return [center + side * mpmath.mpf(step) / REDUCTION ** k for k in range(SEQUENCE_TERMS)]
+
+
+def _values(func, points: list):
+    """Значения на последовательности; None — функция там не определена (или комплексна)"""
+    values = []
+    for point in points:
+        try:
+            value = func(point)
+        except (ValueError, ZeroDivisionError, OverflowError, TypeError):
+            return None
+        if isinstance(value, mpmath.mpc):
+            if abs(value.imag) > mpmath.mpf(10) ** (-LIMIT_DIGITS // 2) * max(1, abs(value.real)):
+                return None
+            value = value.real
+        if not mpmath.isfinite(value):
+            return None
+        values.append(mpmath.mpf(value))
+    return values
+
+
+def _richardson(values: list) -> tuple:
+    """Экстраполяция Ричардсона (шаг уменьшается в REDUCTION раз) -> (оценка, погрешность)"""
+    column, best, previous = list(values), (values[-1], abs(values[-1] - values[-2])), values[-1]
+    for j in range(1, len(values)):
+        factor = REDUCTION ** j - 1
+        column = [column[i + 1] + (column[i + 1] - column[i]) / factor for i in range(len(column) - 1)]
+        error = abs(column[-1] - previous)
+        if error < best[1]:
+            best = (column[-1], error)
+        previous = column[-1]
+    return best
+
+
+def _aitken(values: list) -> tuple:
+    """Δ²-процесс Эйткена -> (оценка, погрешность); расходящиеся отсеиваются раньше"""
+    accelerated = []
+    for a, b, c in zip(values, values[1:], values[2:]):
+        denominator = c - 2 * b + a
+        accelerated.append(c if denominator == 0 else c - (c - b) ** 2 / denominator)
+    return accelerated[-1], abs(accelerated[-1] - accelerated[-2])
+
+
+def _infinite(values: list):
+    """±oo, если |f| на хвосте растет с постоянным знаком (Эйткен свел бы такой ряд к нулю).
+
+    Рост геометрический (1/x) или медленный, но без замедления (ln x: шаг
+    уменьшается в REDUCTION раз, а значение меняется на одно и то же ln 10).
+    """
+    tail = values[-4:]
+    if len({mpmath.sign(value) for value in tail}) > 1:
+        return None
+    infinity = sp.oo if tail[-1] > 0 else -sp.oo
+    if abs(tail[-1]) >= INFINITY_THRESHOLD and all(abs(b) > INFINITY_GROWTH * abs(a) for a, b in zip(tail, tail[1:])):
+        return infinity
+    steps = [b - a for a, b in zip(values[-5:], values[-4:])]
+    if (abs(tail[-1]) >= SLOW_INFINITY_THRESHOLD and len({mpmath.sign(step) for step in steps}) == 1
+            and mpmath.sign(steps[-1]) == mpmath.sign(tail[-1])
+            and all(abs(b) >= SLOW_GROWTH * abs(a) for a, b in zip(steps, steps[1:]))):
+        return infinity
+    return None
+
+
+def one_sided(func, point, side: int):
+    """Односторонний предел -> (значение, погрешность) или None"""
+    values = _values(func, _points(point, side))
+    if values is None:
+        return None
+    infinite = _infinite(values)
+    if infinite is not None:
+        return infinite, 0.0
+    value, error = min(_richardson(values), _aitken(values), key=lambda estimate: estimate[1])
+    # Соседние оценки согласны и при медленной сходимости (x·ln x, ln x): погрешность не
+    # меньше расстояния до последнего члена, который ближе всего к точке
+    return value, float(max(error, abs(value - values[-1])))
+
+
+def _settled(value, error: float) -> bool:
+    """Погрешность мала по сравнению со значением (иначе значения колеблются или не сходятся)"""
+    return value in (sp.oo, -sp.oo) or error <= UNDETERMINED_ERROR * max(1.0, abs(float(value)))
+
+
+def confidence(value, error: float) -> str:
+    if value in (sp.oo, -sp.oo):
+        # Рост без границ виден лишь на конечном отрезке последовательности
+        return "средняя"
+    relative = error / max(1.0, abs(float(value)))
+    for bound, level in CONFIDENCE_LEVELS:
+        if relative < bound:
+            return level
+    return "низкая"
+
+
+def _as_sympy(value, error: float):
+    if value in (sp.oo, -sp.oo):
+        return value
+    if abs(value) <= max(3 * error, mpmath.mpf(10) ** (-LIMIT_DIGITS // 2)):
+        # Значение в пределах погрешности от нуля
+        return sp.Integer(0)
+    # Показываем только значащие цифры
+    relative = error / max(1.0, abs(float(value)))
+    digits = 15 if relative == 0 else min(15, max(3, int(-mpmath.log10(relative))))
+    return sp.Float(float(value), digits)
+
+
+def numeric_limit(func, var, point) -> dict:
+    """Численная оценка предела; None — с параметрами или нигде не определена.
+
+    value None — предел не определяется: погрешность хотя бы одной стороны
+    сравнима со значением (sin(1/x) в нуле, cos x на бесконечности).
+    """
+    if (func.free_symbols | point.free_symbols) - {var}:
+        return None
+    with mpmath.workdps(LIMIT_DIGITS):
+        evaluate = sp.lambdify(var, func, modules="mpmath")
+        if point in (sp.oo, -sp.oo):
+            sides = {"right": one_sided(evaluate, point, 1)}
+        else:
+            sides = {"left": one_sided(evaluate, point, -1), "right": one_sided(evaluate, point, 1)}
+    found = {name: estimate for name, estimate in sides.items() if estimate is not None}
+    if not found:
+        return None
+
+    values = {name: _as_sympy(*estimate) for name, estimate in found.items()}
+    error = max(estimate[1] for estimate in found.values())
+    if not all(_settled(*estimate) for estimate in found.values()):
+        # Сравнивать стороны с такой погрешностью бессмысленно
+        return {
+            "value": None,
+            "method": "numeric",
+            "error_estimate": error,
+            "confidence": "низкая",
+            "sides": values,
+            "mismatch": False,
+        }
+    mismatch = False
+    if len(found) == 2:
+        (left, left_error), (right, right_error) = found["left"], found["right"]
+        if sp.oo in (left, right) or -sp.oo in (left, right):
+            mismatch = left != right
+        else:
+            mismatch = abs(left - right) > 10 * (left_error + right_error) + 1e-9 * max(1, abs(left), abs(right))
+    # Как и sympy.limit по умолчанию, основной ответ — предел справа
+    side = "right" if "right" in found else "left"
+    return {
+        "value": values[side],
+        "method": "numeric",
+        "error_estimate": error,
+        "confidence": confidence(found[side][0], error),
+        "sides": values,
+        "mismatch": mismatch,
+    }
+
+
+def find_limit(func, var, point, deadline: float = None) -> dict:
+    """Предел: sympy под бюджетом, иначе численно.
+
+    Возвращает {"value", "method": "symbolic" | "numeric", ...} или None.
+    """
+    try:
+        with time_limit(share_of_remaining(deadline, SYMBOLIC_BUDGET)):
+            value = sp.limit(func, var, point)
+        if not value.has(sp.Limit):
+            return {"value": value, "method": "symbolic"}
+    except BudgetExceeded:
+        pass
+    except Exception as e:
+        # Внутренние ошибки sympy.limit на экзотических выражениях — тоже повод считать численно
+        logger.error(f"Symbolic limit error: {e}")
+    return numeric_limit(func, var, point)
@@ -0,0 +1,57 @@
+"""Ограничение памяти решателя.
+
+SymPy кэширует результаты (cacheit) в каждом процессе; размер кэша
+задается переменной SYMPY_CACHE_SIZE (ее читает сам sympy при импорте).
+Кэш дополнительно очищается каждые SYMPY_CACHE_CLEAR_EVERY задач.
+Процесс-решатель пула перезапускается после WORKER_MAX_TASKS задач или
+когда его RSS превышает WORKER_MAX_RSS_MB.
+"""
+import logging
+import os
+
+# Очистка кэша SymPy раз в N задач (0 — не чистить)
+SYMPY_CACHE_CLEAR_EVERY = int(os.getenv("SYMPY_CACHE_CLEAR_EVERY", 500))
+
+# Перезапуск процесса-решателя (0 — без ограничения)
+WORKER_MAX_TASKS = int(os.getenv("WORKER_MAX_TASKS", 1000))
+WORKER_MAX_RSS_MB = float(os.getenv("WORKER_MAX_RSS_MB", 512))
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+logger = logging.getLogger(__name__)
+
+_tasks_since_clear = 0
+
+
+def rss_bytes(pid=None):
+    """Текущий RSS процесса (по умолчанию своего); None, если /proc недоступен"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def clear_caches():
+    """Очистка кэша SymPy (наши lru-кэши разбора и вывода ограничены по размеру)"""
+    from sympy.core.cache import clear_cache
+    clear_cache()
+
+
+def task_done():
+    """Отмечает решенную задачу; каждые SYMPY_CACHE_CLEAR_EVERY задач чистит кэш"""
+    global _tasks_since_clear
+    _tasks_since_clear += 1
+    if SYMPY_CACHE_CLEAR_EVERY and _tasks_since_clear >= SYMPY_CACHE_CLEAR_EVERY:
+        _tasks_since_clear = 0
+        clear_caches()
+        logger.info(f"🧹 Кэш SymPy очищен, RSS {(rss_bytes() or 0) / 2**20:.0f} МБ")
+
+
+def recycle_reason(tasks: int, rss) -> str:
+    """Причина перезапуска процесса-решателя или None"""
+    if WORKER_MAX_TASKS and tasks >= WORKER_MAX_TASKS:
+        return "tasks"
+    if WORKER_MAX_RSS_MB and rss is not None and rss > WORKER_MAX_RSS_MB * 2**20:
+        return "rss"
+    return None
@@ -0,0 +1,129 @@
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Счетчик с метками"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        for label_values, value in items:
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (наблюдение — одна бинарная вставка)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                # Счетчики корзин (последняя — +Inf), сумма, количество
+                series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self.values.items()]
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", _format_labels(self.labels, label_values, [("le", bound)]), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labels, label_values), total
+            yield f"{self.name}_count", _format_labels(self.labels, label_values), count
+
+
+class CallbackMetric:
+    """Значение считается в момент выгрузки метрик"""
+
+    def __init__(self, name, help_text, callback, labels=(), kind="gauge"):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.labels = tuple(labels)
+
+    def samples(self):
+        value = self.callback()
+        if isinstance(value, dict):
+            for label_values, item in value.items():
+                if not isinstance(label_values, tuple):
+                    label_values = (label_values,)
+                yield self.name, _format_labels(self.labels, label_values), item
+        elif value is not None:
+            yield self.name, "", value
+
+
+class Registry:
+    """Набор метрик и их выгрузка в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        # Повторная регистрация по имени заменяет метрику (новый экземпляр бота)
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def callback(self, name, help_text, callback, labels=(), kind="gauge"):
+        return self.register(CallbackMetric(name, help_text, callback, labels, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,246 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_writer import BatchedSQLiteWriter
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """LRU-кэш решений с TTL и необязательным файлом на диске"""
+
+    # Есть ли медленный общий уровень за памятью процесса (см. get_shared)
+    shared = False
+
+    def __init__(self, max_size=1000, ttl=86400, path=None, save_every=50):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.save_every = save_every
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = 0
+        self.lock = threading.Lock()
+        # Снимок на диск пишет фоновый поток, по одному за раз
+        self.save_lock = threading.Lock()
+        self.saver = None
+        if path:
+            self.load()
+
+    def get(self, key):
+        """Возвращает сохраненный результат или None"""
+        return self.get_local(key)
+
+    def get_local(self, key):
+        """Поиск только в памяти процесса: без ввода-вывода, можно звать из event loop"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_shared(self, key):
+        """Поиск в общем уровне после промаха get_local (здесь его нет)"""
+        return None
+
+    def put(self, key, value):
+        """Сохраняет результат, вытесняя самые старые записи"""
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self.dirty += 1
+            need_save = self.path and self.dirty >= self.save_every
+        if need_save:
+            self.save_in_background()
+
+    def save_in_background(self):
+        """Запись снимка в отдельном потоке: put вызывается из event loop"""
+        if self.saver is not None and self.saver.is_alive():
+            # Изменения войдут в следующий снимок
+            return
+        self.saver = threading.Thread(target=self.save, name="result-cache-save", daemon=True)
+        self.saver.start()
+
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def close(self):
+        """Сохранение перед остановкой"""
+        if self.saver is not None:
+            self.saver.join()
+        self.save()
+
+    def load(self):
+        """Загрузка кэша из файла (протухшие записи отбрасываются)"""
+        try:
+            with open(self.path, 'rb') as f:
+                entries = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Cache load error: {e}")
+            return
+        now = time.time()
+        with self.lock:
+            for key, (stored_at, value) in entries.items():
+                if not self.ttl or now - stored_at <= self.ttl:
+                    self.entries[key] = (stored_at, value)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        logger.info(f"💾 Загружено {len(self.entries)} решений из кэша")
+
+    def save(self):
+        """Атомарная запись кэша в файл"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with self.save_lock:
+            with self.lock:
+                entries = OrderedDict(self.entries)
+                self.dirty = 0
+            try:
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.error(f"Cache save error: {e}")
+
+
+class SQLiteResultCache(ResultCache):
+    """Кэш решений в SQLite (WAL), общий для всех процессов на машине.
+
+    Горячая часть хранится в памяти процесса, как в ResultCache; промах в
+    памяти проверяется в базе (get_shared — блокирующий, из event loop
+    только через поток). Запись в базу идет пачками в фоновом потоке,
+    put ждет только памяти.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, max_size=1000, ttl=86400, shared_size=100000, batch_size=100):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.db_path = path
+        self.shared_size = shared_size
+        self.shared_hits = 0
+        self.writes = 0
+        self.db_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key BLOB PRIMARY KEY,
+                stored_at REAL NOT NULL,
+                value BLOB NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS results_age ON results (stored_at)")
+        conn.commit()
+        conn.close()
+
+        self.conn = self._connect(check_same_thread=False)
+        self.writer = BatchedSQLiteWriter(self._connect, self._write, batch_size, name="result-cache-writer")
+
+    def _connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=check_same_thread)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key):
+        value = self.get_local(key)
+        if value is not None:
+            return value
+        return self.get_shared(key)
+
+    def get_shared(self, key):
+        try:
+            with self.db_lock:
+                row = self.conn.execute(
+                    "SELECT stored_at, value FROM results WHERE key = ?", (pickle.dumps(key),)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Shared cache read error: {e}")
+            return None
+        if row is None or (self.ttl and time.time() - row[0] > self.ttl):
+            return None
+        value = pickle.loads(row[1])
+        with self.lock:
+            # Промах в памяти оказался попаданием в общем кэше
+            self.misses -= 1
+            self.hits += 1
+            self.shared_hits += 1
+        ResultCache.put(self, key, value)
+        return value
+
+    def put(self, key, value):
+        """Запись в память сразу, в базу — через очередь фонового потока"""
+        super().put(key, value)
+        self.writer.put((key, time.time(), value))
+
+    def flush(self):
+        """Дождаться записи в базу всех поставленных в очередь решений"""
+        self.writer.flush()
+
+    def _write(self, conn, rows):
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (key, stored_at, value) VALUES (?, ?, ?)",
+                [
+                    (pickle.dumps(key), stored_at, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+                    for key, stored_at, value in rows
+                ]
+            )
+        previous, self.writes = self.writes, self.writes + len(rows)
+        if self.writes // 500 > previous // 500:
+            self._trim(conn)
+
+    def _trim(self, conn):
+        """Удаляет протухшие записи и самые старые сверх shared_size"""
+        with conn:
+            if self.ttl:
+                conn.execute("DELETE FROM results WHERE stored_at < ?", (time.time() - self.ttl,))
+            conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.shared_size,)
+            )
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["shared_hits"] = self.shared_hits
+        return stats
+
+    def close(self):
+        super().close()
+        self.writer.close()
+        with self.db_lock:
+            self.conn.close()
+
+
+def create_result_cache(backend: str = "memory", max_size=1000, ttl=86400, path=None, db_path="cache.db"):
+    """Создание кэша решений по имени бэкенда"""
+    if backend == "sqlite":
+        return SQLiteResultCache(db_path, max_size=max_size, ttl=ttl)
+    return ResultCache(max_size=max_size, ttl=ttl, path=path)
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Дешевые задачи обслуживаются раньше дорогих
+TASK_PRIORITIES = {
+    "general": 0,
+    "factor": 1, "expand": 1, "equation": 1, "derivative": 1,
+    "integral": 2, "limit": 2,
+}
+
+
+class RateLimited(Exception):
+    """Пользователь превысил свой лимит запросов"""
+
+
+class Overloaded(Exception):
+    """Общая очередь решателя заполнена"""
+
+
+class TokenBucket:
+    """Ведро токенов: rate запросов в секунду, не больше burst подряд"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        self.refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class SolveScheduler:
+    """Очередь задач между обработчиком и решателем.
+
+    Лимиты на пользователя, общая ограниченная очередь и обход пользователей
+    по кругу внутри каждого уровня приоритета. Задачи одного пользователя
+    передаются в solve(expression, on_step, user_id) в порядке поступления.
+    """
+
+    def __init__(self, solve, concurrency=2, max_queue=100, user_rate=0.5, user_burst=5):
+        self.solve = solve
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.buckets = {}
+        # Уровень приоритета -> {user_id: очередь задач пользователя}
+        self.levels = {}
+        self.depth = 0
+        self.running = 0
+        self.ready = None
+        self.dispatchers = []
+
+    def _start(self):
+        self.ready = asyncio.Semaphore(0)
+        self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.concurrency)]
+
+    def _admit(self, user_id):
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            if len(self.buckets) > 10000:
+                self._prune_buckets()
+            bucket = self.buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        if not bucket.take():
+            raise RateLimited(user_id)
+
+    def _prune_buckets(self):
+        """Полные ведра ничем не отличаются от новых — их можно забыть"""
+        now = time.monotonic()
+        for user_id, bucket in list(self.buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self.buckets[user_id]
+
+    async def submit(self, user_id, task_type: str, expression: str, on_step=None):
+        """Поставить задачу в очередь и дождаться результата"""
+        if not self.dispatchers:
+            self._start()
+        # Сначала общая очередь: отказ из-за перегрузки не тратит токен пользователя
+        if self.depth >= self.max_queue:
+            raise Overloaded(expression)
+        self._admit(user_id)
+
+        future = asyncio.get_running_loop().create_future()
+        level = self.levels.setdefault(TASK_PRIORITIES.get(task_type, 1), OrderedDict())
+        level.setdefault(user_id, deque()).append((expression, on_step, future))
+        self.depth += 1
+        self.ready.release()
+        return await future
+
+    def _next_job(self):
+        for priority in sorted(self.levels):
+            users = self.levels[priority]
+            if users:
+                # Берем задачу первого пользователя и отправляем его в конец круга
+                user_id, jobs = users.popitem(last=False)
+                job = jobs.popleft()
+                if jobs:
+                    users[user_id] = jobs
+                self.depth -= 1
+                return (user_id,) + job
+        return None
+
+    async def _dispatch(self):
+        while True:
+            await self.ready.acquire()
+            user_id, expression, on_step, future = self._next_job()
+            if future.done():
+                # Обработчик уже не ждет ответа
+                continue
+            self.running += 1
+            try:
+                future.set_result(await self.solve(expression, on_step, user_id))
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.running -= 1
+
+    async def shutdown(self):
+        """Отменить обработчики очереди и дождаться их, пока event loop еще работает"""
+        dispatchers, self.dispatchers = self.dispatchers, []
+        for task in dispatchers:
+            task.cancel()
+        await asyncio.gather(*dispatchers, return_exceptions=True)
+
+    def stop(self):
+        """Синхронная отмена; после закрытия event loop задачи уже не отменить — просто забываем их"""
+        for task in self.dispatchers:
+            if not task.get_loop().is_closed():
+                task.cancel()
+        self.dispatchers = []
+
+
+class SingleFlight:
+    """Одинаковые запросы в работе ждут одно общее вычисление.
+
+    Отказы из unshared (лимит автора, переполнение) касаются только того,
+    кто начал вычисление: остальные в этом случае пробуют сами.
+    """
+
+    def __init__(self, unshared=(RateLimited, Overloaded)):
+        self.unshared = unshared
+        self.calls = {}
+        self.shared = 0
+
+    async def run(self, key, factory):
+        """Результат factory() для key; повторный вызов во время работы ждет первый"""
+        while True:
+            task = self.calls.get(key)
+            if task is None:
+                task = asyncio.ensure_future(factory())
+                self.calls[key] = task
+                task.add_done_callback(lambda done, key=key: self._forget(key, done))
+                # shield: отмена одного ожидающего не отменяет вычисление для остальных
+                return await asyncio.shield(task)
+            self.shared += 1
+            try:
+                return await asyncio.shield(task)
+            except self.unshared:
+                continue
+
+    def _forget(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            # Исключение уже доставлено ожидающим; без этого asyncio пишет "never retrieved"
+            task.exception()
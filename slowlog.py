@@ -0,0 +1,109 @@
+"""Журнал медленных запросов и выборочное профилирование решателя.
+
+Запрос дольше SLOW_REQUEST_THRESHOLD секунд попадает в журнал одной
+JSON-строкой: текст, результат предобработки, тип задачи, время этапов.
+Профилирование включается на ходу, без перезапуска: пока существует
+файл PROFILE_FLAG_FILE, процессы-решатели профилируют долю
+PROFILE_SAMPLE_RATE запросов, а по медленным пишут самые горячие вызовы
+SymPy в PROFILE_DIR (хранятся последние PROFILE_KEEP файлов).
+
+    touch profile.on   # включить
+    rm profile.on      # выключить
+"""
+import cProfile
+import glob
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", 2))
+SLOW_LOG_FILE = os.getenv("SLOW_LOG_FILE")
+
+PROFILE_FLAG_FILE = os.getenv("PROFILE_FLAG_FILE", "profile.on")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.1))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))
+PROFILE_TOP = 40
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger("mathbot.slow")
+if SLOW_LOG_FILE:
+    handler = RotatingFileHandler(SLOW_LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=5, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_logger.addHandler(handler)
+    slow_logger.setLevel(logging.WARNING)
+    slow_logger.propagate = False
+
+
+def log_slow_request(expression: str, clean_expr: str, task_type: str, elapsed: float,
+                     outcome: str, timings: dict = None, detail: str = None, profile: str = None):
+    """Запись о медленном запросе (вызывается для запросов дольше порога)"""
+    record = {
+        "time": datetime.now().isoformat(),
+        "elapsed": round(elapsed, 4),
+        "outcome": outcome,
+        "task_type": task_type,
+        "expression": expression,
+        "clean_expr": clean_expr,
+        "timings": {name: round(value, 4) for name, value in (timings or {}).items()},
+    }
+    if detail:
+        record["detail"] = detail
+    if profile:
+        record["profile"] = profile
+    slow_logger.warning(f"🐌 {json.dumps(record, ensure_ascii=False)}")
+
+
+def profiling_enabled() -> bool:
+    return os.path.exists(PROFILE_FLAG_FILE)
+
+
+class ProfileResult:
+    """Путь к файлу профиля, если запрос оказался медленным"""
+    path = None
+
+
+@contextmanager
+def sampled_profile(expression: str):
+    """Профилирует блок, если профилирование включено и запрос попал в выборку"""
+    result = ProfileResult()
+    if not profiling_enabled() or random.random() >= PROFILE_SAMPLE_RATE:
+        yield result
+        return
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        if elapsed >= SLOW_REQUEST_THRESHOLD:
+            result.path = dump_profile(profiler, expression, elapsed)
+
+
+def dump_profile(profiler, expression: str, elapsed: float):
+    """Самые дорогие вызовы (сначала SymPy) в файл; старые файлы удаляются"""
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"profile-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.txt")
+        buffer = io.StringIO()
+        buffer.write(f"expression: {expression}\nelapsed: {elapsed:.3f} s\n\n")
+        stats = pstats.Stats(profiler, stream=buffer).sort_stats("cumulative")
+        stats.print_stats("sympy", PROFILE_TOP)
+        stats.print_callers("sympy", 10)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(buffer.getvalue())
+        for old in sorted(glob.glob(os.path.join(PROFILE_DIR, "profile-*.txt")))[:-PROFILE_KEEP]:
+            os.remove(old)
+        return path
+    except Exception as e:
+        logger.error(f"Profile dump error: {e}")
+        return None
@@ -0,0 +1,779 @@
+import os
+import re
+import time
+import builtins
+import types
+import logging
+from functools import lru_cache
+
+import sympy as sp
+from sympy.parsing.sympy_parser import parse_expr, standard_transformations, convert_xor
+from sympy import pretty, symbols, solve, integrate, diff, limit, simplify, factor, expand, cancel, together, count_ops, sqrt, sin, cos, tan, log, exp, pi, E, oo
+
+import memory
+import stages
+from slowlog import sampled_profile
+from arithmetic import APPROXIMATE_DIGITS, TooLarge, evaluate_approximate, evaluate_exact, unevaluated
+from derivatives import derivative_chain, describe, split_arguments, parse_request as parse_derivative
+from equations import SCAN_RANGE, find_roots
+from integrals import definite_integral
+from limits import find_limit
+
+logger = logging.getLogger(__name__)
+
+# Бюджет времени на один запрос
+SOLVE_TIMEOUT = float(os.getenv("SOLVE_TIMEOUT", 10))
+
+# Упрощение: полный simplify только для небольших выражений и при запасе времени
+SIMPLIFY_MAX_OPS = int(os.getenv("SIMPLIFY_MAX_OPS", 60))
+SIMPLIFY_MIN_BUDGET = float(os.getenv("SIMPLIFY_MIN_BUDGET", 2))
+
+# Производные высших порядков: сколько последних промежуточных показывать в шагах
+DERIVATIVE_SHOWN_ORDERS = int(os.getenv("DERIVATIVE_SHOWN_ORDERS", 3))
+
+# Таблицы предобработки (компилируются один раз при загрузке модуля)
+REMOVE_WORDS = ['пожалуйста', 'мне', 'нужно', 'найти', 'можно', 'ли', 'ты', 'вы', 'сможешь']
+REMOVE_WORDS_RE = re.compile(r'\b(?:' + '|'.join(map(re.escape, REMOVE_WORDS)) + r')\b')
+
+# Порядок важен: как и при последовательных replace, раньше срабатывают
+# более ранние ключи ('реши' поглощает начало 'решить')
+MATH_COMMANDS = {
+    'реши': '', 'решить': '', 'посчитай': '', 'вычисли': '',
+    'производная': 'diff', 'производную': 'diff', 'дифференциал': 'diff', 'дифференцируй': 'diff',
+    'интеграл': 'integrate', 'интеграла': 'integrate', 'интегрируй': 'integrate',
+    'предел': 'limit', 'лимит': 'limit',
+    'упростить': 'simplify', 'упрости': 'simplify',
+    'разложи': 'factor', 'разложить': 'factor', 'факторизуй': 'factor',
+    'раскрой': 'expand', 'раскрыть': 'expand',
+    'уравнение': 'solve', 'реши уравнение': 'solve', 'найди корни': 'solve',
+    'от': ' ', 'по': ' ', 'для': ' ', 'переменной': ' ',
+    'при': ',', 'стремится': ',', 'стремиться': ',',
+    '→': ',', '->': ',',
+    'бесконечность': 'oo', 'бесконечности': 'oo'
+}
+MATH_COMMANDS_RE = re.compile('|'.join(map(re.escape, MATH_COMMANDS)))
+
+# Степени: "x²" -> "x**2", "eˣ" -> "e**x", "x¹⁰" -> "x**(10)"
+SUPERSCRIPTS = str.maketrans('⁰¹²³⁴⁵⁶⁷⁸⁹ˣʸⁿ', '0123456789xyn')
+# Сами надстрочные знаки тоже входят в \w — исключаем их из основания
+SUPERSCRIPT_RE = re.compile(r'([^\W⁰¹²³⁴⁵⁶⁷⁸⁹ˣʸⁿ]+)([⁰¹²³⁴⁵⁶⁷⁸⁹ˣʸⁿ]+)')
+
+SYMBOL_TABLE = str.maketrans({
+    '^': '**', '×': '*', '÷': '/', '⋅': '*',
+    '√': 'sqrt', '∣': 'abs', '|': 'abs',
+    'π': 'pi', '∞': 'oo', '∫': 'integrate',
+    'е': 'e', 'ё': 'e'
+})
+LOG_NAMES = {'ln': 'log', 'lg': 'log10'}
+LOG_RE = re.compile('ln|lg')
+
+SPACES_RE = re.compile(r'\s+')
+DOUBLE_COMMA_RE = re.compile(r',\s*,')
+
+# Определенный интеграл после предобработки: "integrate f dx 0 до 2" ("от" уже удалено)
+# Служебные слова после предобработки — не часть самого выражения
+COMMAND_WORDS_RE = re.compile(r'\b(?:diff|integrate|limit|solve|simplify|factor|expand)\b')
+
+INTEGRAL_BOUNDS_RE = re.compile(r'^(.*?)\s+(\S+)\s+до\s+(\S+)\s*$')
+INTEGRAL_CALL_RE = re.compile(r'integrate\((.+),\s*([a-z])\s*(?:,([^,]+),([^,]+))?\)\s*$')
+DIFFERENTIAL_RE = re.compile(r'\s*\bd([a-z])\s*$')
+LIMIT_CALL_RE = re.compile(r'limit\((.*)\)\s*$')
+
+# Общее пространство имен для разбора выражений (создается один раз)
+X, Y, Z = symbols('x y z')
+
+def _cot(arg):
+    return 1/tan(arg)
+
+SAFE_NAMESPACE = types.MappingProxyType({
+    'x': X, 'y': Y, 'z': Z,
+    'sin': sin, 'cos': cos, 'tan': tan, 'cot': _cot,
+    'sqrt': sqrt, 'log': log, 'ln': log, 'exp': exp,
+    'pi': pi, 'e': E, 'oo': oo,
+    'abs': abs, 'factorial': sp.factorial,
+    'diff': diff, 'integrate': integrate, 'limit': limit,
+    'solve': solve, 'simplify': simplify, 'factor': factor, 'expand': expand
+})
+
+# То же глобальное окружение, что sympify собирает заново при каждом вызове
+SYMPY_GLOBALS = {}
+exec('from sympy import *', SYMPY_GLOBALS)
+SYMPY_GLOBALS.update({
+    name: obj for name, obj in vars(builtins).items()
+    if isinstance(obj, types.BuiltinFunctionType)
+})
+SYMPY_GLOBALS.update({'max': sp.Max, 'min': sp.Min})
+
+PARSE_TRANSFORMATIONS = standard_transformations + (convert_xor,)
+
+# Число вплотную к имени или скобке: 2x -> 2*x, 3(x+1) -> 3*(x+1); 1e5 не трогаем
+IMPLICIT_MULT_RE = re.compile(r'\b(\d+)(?![eE][+-]?\d)(?=[a-z(])')
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", 4096))
+
+# Разбор только ради структуры (ключи кэша, оценка стоимости) идет в процессе бота,
+# поэтому ничего не вычисляет: функции становятся неопределенными, evaluate=False
+STRUCTURE_NAMESPACE = types.MappingProxyType({'pi': pi, 'e': E, 'oo': oo, 'I': sp.I})
+STRUCTURE_GLOBALS = {
+    name: getattr(sp, name)
+    for name in ('Symbol', 'Function', 'Integer', 'Float', 'Rational', 'Add', 'Mul', 'Pow')
+}
+
+def _parse(expr_str: str, structure: bool = False):
+    # Заменяем ** на ^ для временного парсинга
+    temp_expr = expr_str.replace('**', '^').replace('\n', '')
+    temp_expr = IMPLICIT_MULT_RE.sub(r'\1*', temp_expr)
+    return parse_expr(
+        temp_expr,
+        local_dict=dict(STRUCTURE_NAMESPACE if structure else SAFE_NAMESPACE),
+        global_dict=dict(STRUCTURE_GLOBALS) if structure else SYMPY_GLOBALS,
+        transformations=PARSE_TRANSFORMATIONS,
+        evaluate=not structure
+    )
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_cached(expr_str: str):
+    """Разбор строки с кэшем; неудачи тоже кэшируются (как None)"""
+    try:
+        return _parse(expr_str)
+    except Exception as e:
+        logger.error(f"Sympify error: {e}")
+        return None
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_structure(expr_str: str):
+    """Дерево выражения без вычислений; None — не разбирается"""
+    try:
+        return _parse(expr_str, structure=True)
+    except Exception:
+        return None
+
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", 2048))
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE, typed=True)
+def pretty_cached(expr, as_list: bool = False) -> str:
+    """pretty() с кэшем: одно и то же выражение попадает в шаги и в ответ"""
+    return pretty(list(expr) if as_list else expr, use_unicode=True)
+
+def render(expr) -> str:
+    """Красивый вывод выражения (отдельный этап замера)"""
+    with stages.stage("pretty"):
+        if isinstance(expr, list):
+            # Корни уравнения: список нехешируемый, кэшируем как кортеж
+            return pretty_cached(tuple(expr), True)
+        try:
+            return pretty_cached(expr)
+        except TypeError:
+            return pretty(expr, use_unicode=True)
+
+class StepLog(list):
+    """Шаги решения, о каждом новом шаге сообщается сразу (потоковые ответы)"""
+
+    def __init__(self, steps, on_step):
+        super().__init__(steps)
+        self.on_step = on_step
+
+    def append(self, step):
+        super().append(step)
+        try:
+            self.on_step(step)
+        except Exception as e:
+            # Прогресс — украшение: его сбой не должен ломать решение
+            logger.error(f"Progress error: {e}")
+
+class MathSolver:
+    """Решатель без Telegram: предобработка, разбор и решение выражений"""
+
+    def smart_preprocess(self, text: str) -> str:
+        """Умная предварительная обработка с улучшенным пониманием"""
+        original_text = text
+        text = text.lower().strip()
+        
+        # Удаляем лишние слова
+        text = REMOVE_WORDS_RE.sub('', text)
+        
+        # Замена русских команд на математические (один проход)
+        text = MATH_COMMANDS_RE.sub(lambda m: MATH_COMMANDS[m.group()], text)
+        
+        # Умная замена математических обозначений
+        text = SUPERSCRIPT_RE.sub(self._power, text)
+        
+        text = text.translate(SYMBOL_TABLE)
+        text = LOG_RE.sub(lambda m: LOG_NAMES[m.group()], text)
+        
+        # Обработка пределов с естественным языком
+        limit_pattern = r'limit\(([^,]+),([^,]+),([^)]+)\)'
+        if 'limit' not in text and ('стремится' in original_text or '→' in original_text or 'при' in original_text):
+            # Автоматическое создание limit из естественного языка
+            if 'x→' in text or 'x->' in text:
+                parts = re.split(r'x[→->]', text)
+                if len(parts) == 2:
+                    func = parts[0].strip()
+                    point = parts[1].strip()
+                    text = f'limit({func}, x, {point})'
+        
+        # Удаление лишних пробелов и очистка
+        text = SPACES_RE.sub(' ', text).strip()
+        text = DOUBLE_COMMA_RE.sub(',', text)  # Удаляем лишние запятые
+        
+        return text if text else original_text
+
+    @staticmethod
+    def _power(match) -> str:
+        power = match.group(2).translate(SUPERSCRIPTS)
+        return f"{match.group(1)}**{power if len(power) == 1 else f'({power})'}"
+
+    @stages.timed("safe_sympify")
+    def safe_sympify(self, expr_str: str):
+        """Безопасное преобразование строки в sympy выражение"""
+        return parse_cached(expr_str)
+
+    def solve_expression(self, expression: str, deadline: float = None, on_step=None) -> dict:
+        """Решение с замером времени этапов (поле timings результата).
+
+        on_step(step) вызывается для каждого шага по мере решения.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + SOLVE_TIMEOUT
+        with sampled_profile(expression) as profile, stages.request() as timings:
+            result = self.solve_pipeline(expression, deadline, on_step)
+        result["timings"] = timings.as_dict()
+        if profile.path:
+            result["profile"] = profile.path
+        if isinstance(result.get("steps"), StepLog):
+            result["steps"] = list(result["steps"])
+        memory.task_done()
+        return result
+
+    def solve_pipeline(self, expression: str, deadline: float, on_step=None) -> dict:
+        """Умное решение математического выражения с улучшенным пониманием"""
+        try:
+            original_expr = expression
+            
+            # Умная предобработка
+            with stages.stage("smart_preprocess"):
+                clean_expr = self.smart_preprocess(expression)
+            
+            # Определяем тип задачи
+            with stages.stage("detect_task_type"):
+                task_type = self.detect_task_type(clean_expr, original_expr)
+            steps = self.initial_steps(original_expr)
+            if on_step:
+                steps = StepLog(steps, on_step)
+            
+            # Пробуем разные методы решения
+            with stages.stage("solve"):
+                result = self.run_task(task_type, clean_expr, steps, deadline)
+            
+            if result and result["success"]:
+                # Финальный ответ рисуем здесь, чтобы бот не рендерил его повторно
+                result["answer"] = render(result["result"])
+                return result
+            else:
+                return {
+                    "success": False,
+                    "error": "Не удалось распознать пример",
+                    "detail": (result or {}).get("error"),
+                    "steps": ["❌ *Пример не понятен*", "💡 Попробуйте сформулировать иначе"]
+                }
+                
+        except Exception as e:
+            logger.error(f"Solution error: {e}")
+            return {
+                "success": False,
+                "error": "Не удалось обработать запрос",
+                "detail": str(e),
+                "steps": ["❌ *Пример не понятен*", "🎯 Попробуйте изменить формулировку"]
+            }
+
+    def initial_steps(self, expression: str) -> list:
+        """Общие первые шаги любого решения"""
+        return [self.request_step(expression), "🔍 *Определяем тип задачи...*"]
+
+    def run_task(self, task_type: str, clean_expr: str, steps: list, deadline: float) -> dict:
+        """Вызов решателя для типа задачи"""
+        if task_type == "derivative":
+            return self.solve_advanced_derivative(clean_expr, steps, deadline)
+        elif task_type == "integral":
+            return self.solve_advanced_integral(clean_expr, steps, deadline)
+        elif task_type == "limit":
+            return self.solve_advanced_limit(clean_expr, steps, deadline)
+        elif task_type == "equation":
+            return self.solve_advanced_equation(clean_expr, steps, deadline)
+        elif task_type == "factor":
+            return self.solve_factorization(clean_expr, steps)
+        elif task_type == "expand":
+            return self.solve_expansion(clean_expr, steps)
+        else:
+            return self.solve_arithmetic(clean_expr, steps) or self.solve_advanced_general(clean_expr, steps, deadline)
+
+    def request_step(self, expression: str) -> str:
+        """Первый шаг решения — исходный запрос пользователя"""
+        return f"🎯 *Запрос:* `{expression}`"
+
+    def cache_key(self, expression: str) -> tuple:
+        """Ключ кэша: результат предобработки и тип задачи"""
+        clean_expr = self.smart_preprocess(expression)
+        return clean_expr, self.detect_task_type(clean_expr, expression)
+
+    def estimate_cost(self, clean_expr: str):
+        """Грубая оценка стоимости: число операций в частях выражения; None — не разбирается"""
+        text = DIFFERENTIAL_RE.sub('', COMMAND_WORDS_RE.sub(' ', clean_expr))
+        cost = 0
+        for part in re.split('[=,]', text):
+            expr = parse_structure(part.strip())
+            if expr is None:
+                return None
+            cost += count_ops(expr)
+        return cost
+
+    def detect_task_type(self, clean_expr: str, original_expr: str) -> str:
+        """Определение типа математической задачи"""
+        original_lower = original_expr.lower()
+        
+        if any(word in original_lower for word in ['производн', 'дифференциал', 'diff']):
+            return "derivative"
+        elif any(word in original_lower for word in ['интеграл', 'integrate', '∫']):
+            return "integral"
+        elif any(word in original_lower for word in ['предел', 'limit', 'стремится', '→']):
+            return "limit"
+        elif any(word in original_lower for word in ['уравнен', 'реши', 'корн', 'solve', '=']):
+            return "equation"
+        elif any(word in original_lower for word in ['разлож', 'факториз', 'factor']):
+            return "factor"
+        elif any(word in original_lower for word in ['раскр', 'expand']):
+            return "expand"
+        else:
+            return "general"
+
+    @stages.timed("simplify")
+    def smart_simplify(self, expr, deadline: float = None) -> tuple:
+        """Ступенчатое упрощение: дешевые преобразования, simplify — только если позволяет бюджет"""
+        if not isinstance(expr, sp.Basic) or expr.is_Atom:
+            return expr, "none"
+        
+        # Дешевые преобразования подбираются по виду выражения
+        if expr.is_polynomial():
+            candidates = [("factor", factor), ("expand", expand)]
+        elif expr.is_rational_function():
+            candidates = [("cancel", cancel), ("factor", factor), ("together", together)]
+        else:
+            candidates = [("together", together), ("cancel", cancel)]
+        
+        best, tier = expr, "none"
+        best_ops = count_ops(expr)
+        for name, func in candidates:
+            try:
+                candidate = func(expr)
+            except Exception:
+                continue
+            ops = count_ops(candidate)
+            if ops < best_ops:
+                best, tier, best_ops = candidate, name, ops
+        
+        # Рациональные функции дешевые преобразования уже приводят к лучшему виду
+        if best.is_rational_function() or best_ops > SIMPLIFY_MAX_OPS:
+            return best, tier
+        if deadline is not None and deadline - time.monotonic() < SIMPLIFY_MIN_BUDGET:
+            return best, tier
+        
+        simplified = simplify(best)
+        if count_ops(simplified) < best_ops:
+            return simplified, "simplify"
+        return best, tier
+
+    def solve_arithmetic(self, clean_expr: str, steps: list) -> dict:
+        """Быстрый путь без sympy для чистой арифметики; None — нужен общий решатель"""
+        try:
+            value = evaluate_exact(clean_expr)
+        except TooLarge:
+            # sympy такой результат тоже не вычислит, а провисит до таймаута
+            return self.solve_too_large(clean_expr, steps)
+        if value is None:
+            return None
+        result = sp.Rational(value.numerator, value.denominator)
+        shown = str(result) if value.denominator == 1 else render(result)
+        steps.append(f"📝 *Выражение:* `{shown}`")
+        return {
+            "success": True,
+            "result": result,
+            "steps": steps,
+            "type": "general",
+            "simplify_tier": "none"
+        }
+
+    def solve_too_large(self, clean_expr: str, steps: list) -> dict:
+        """Слишком большая числовая степень: приближенно или как есть, но не через sympy"""
+        try:
+            value = evaluate_approximate(clean_expr)
+        except TooLarge:
+            value = None
+        if value is None:
+            # С переменными или за пределом оценки: оставляем как написано
+            result = unevaluated(clean_expr)
+            steps.append(f"📝 *Выражение:* `{render(result)}`")
+            steps.append("📏 *Результат слишком велик для вычисления*")
+        else:
+            result = sp.Float(value, APPROXIMATE_DIGITS)
+            steps.append(f"📝 *Выражение:* `{clean_expr}`")
+            steps.append(f"📏 *Точный результат слишком велик — приближенно:* `{render(result)}`")
+        return {
+            "success": True,
+            "result": result,
+            "steps": steps,
+            "type": "general",
+            "simplify_tier": "none",
+            "too_large": True
+        }
+
+    def solve_advanced_general(self, clean_expr: str, steps: list, deadline: float = None) -> dict:
+        """Решение общих математических выражений"""
+        try:
+            expr = self.safe_sympify(clean_expr)
+            if not expr:
+                return {"success": False}
+            
+            steps.append(f"📝 *Выражение:* `{render(expr)}`")
+            
+            # Последовательное упрощение
+            result = expr
+            simplified, tier = self.smart_simplify(expr, deadline)
+            
+            if simplified != expr:
+                steps.append(f"✨ *Упрощаем ({tier}):* `{render(simplified)}`")
+                result = simplified
+            
+            # Дополнительные преобразования для полиномов
+            if result.is_polynomial():
+                factored = factor(result)
+                if factored != result:
+                    steps.append(f"🧩 *Разложение:* `{render(factored)}`")
+                    result = factored
+            
+            return {
+                "success": True,
+                "result": result,
+                "steps": steps,
+                "type": "general",
+                "simplify_tier": tier
+            }
+        except Exception as e:
+            logger.error(f"solve_advanced_general error: {e}")
+            return {"success": False, "error": str(e)}
+
+    def solve_advanced_derivative(self, clean_expr: str, steps: list, deadline: float = None) -> dict:
+        """Производные любого порядка и смешанные: промежуточные берутся из кэша, упрощается только итог"""
+        try:
+            request = parse_derivative(clean_expr, self.safe_sympify)
+            if not request:
+                return {"success": False}
+            func, sequence = request
+            variables = list(dict.fromkeys(sequence))
+            partial = len(variables) > 1
+            
+            steps.append(f"📈 *Функция:* `{render(func)}`")
+            if partial:
+                steps.append(f"🎯 *По переменным:* `{', '.join(map(str, sequence))}`")
+            else:
+                steps.append(f"🎯 *По переменной:* `{variables[0]}`")
+            if len(sequence) > 1:
+                steps.append(f"🔢 *Порядок:* {len(sequence)}")
+            
+            chain, reused = derivative_chain(func, sequence)
+            if reused:
+                steps.append(f"♻️ *Уже вычислено ранее:* `{describe(sequence[:reused], partial)}`")
+            # Промежуточные производные показываем только последние
+            for k in range(max(0, len(chain) - DERIVATIVE_SHOWN_ORDERS), len(chain)):
+                label = "Производная" if len(sequence) == 1 else describe(sequence[:k + 1], partial)
+                steps.append(f"💫 *{label}:* `{render(chain[k])}`")
+            derivative = chain[-1]
+            
+            simplified, tier = self.smart_simplify(derivative, deadline)
+            if simplified != derivative:
+                steps.append(f"✨ *Упрощенная ({tier}):* `{render(simplified)}`")
+            
+            return {
+                "success": True,
+                "result": simplified,
+                "steps": steps,
+                "type": "derivative",
+                "order": len(sequence),
+                "simplify_tier": tier
+            }
+        except Exception as e:
+            logger.error(f"solve_advanced_derivative error: {e}")
+            return {"success": False, "error": str(e)}
+
+    def solve_advanced_integral(self, clean_expr: str, steps: list, deadline: float = None) -> dict:
+        """Решение интегралов с улучшенным пониманием"""
+        try:
+            x = symbols('x')
+            lower_str = upper_str = None
+            
+            call = INTEGRAL_CALL_RE.search(clean_expr)
+            bounds = INTEGRAL_BOUNDS_RE.match(clean_expr)
+            if call:
+                func_str, var_str, lower_str, upper_str = call.groups()
+            else:
+                # Свободная запись: ∫ f dx от a до b
+                if bounds:
+                    clean_expr, lower_str, upper_str = bounds.groups()
+                func_str = clean_expr.replace('integrate', '').strip()
+                differential = DIFFERENTIAL_RE.search(func_str)
+                var_str = differential.group(1) if differential else 'x'
+                if differential:
+                    func_str = func_str[:differential.start()]
+            
+            func = self.safe_sympify(func_str.strip())
+            var = symbols(var_str) if var_str != 'x' else x
+            
+            if not func:
+                return {"success": False}
+            
+            steps.append(f"📊 *Функция:* `{render(func)}`")
+            steps.append(f"🎯 *Переменная:* `{var}`")
+            
+            if lower_str is not None:
+                lower, upper = self.safe_sympify(lower_str.strip()), self.safe_sympify(upper_str.strip())
+                if lower is None or upper is None:
+                    return {"success": False}
+                return self.solve_definite_integral(func, var, lower, upper, steps, deadline)
+            
+            integral = integrate(func, var)
+            steps.append(f"💫 *Интеграл:* `{render(integral)}`")
+            
+            simplified, tier = self.smart_simplify(integral, deadline)
+            if simplified != integral:
+                steps.append(f"✨ *Упрощенный ({tier}):* `{render(simplified)}`")
+            
+            return {
+                "success": True,
+                "result": simplified,
+                "steps": steps,
+                "type": "integral",
+                "simplify_tier": tier
+            }
+        except Exception as e:
+            logger.error(f"solve_advanced_integral error: {e}")
+            return {"success": False, "error": str(e)}
+
+    def solve_definite_integral(self, func, var, lower, upper, steps: list, deadline: float = None) -> dict:
+        """Определенный интеграл: символьно под бюджетом, иначе квадратура mpmath"""
+        steps.append(f"📏 *Пределы:* `от {lower} до {upper}`")
+        
+        integral = definite_integral(func, var, lower, upper, deadline)
+        if integral is None:
+            return {"success": False}
+        
+        value = integral["value"]
+        if value is None:
+            # Число с погрешностью порядка самого числа — не ответ
+            value = sp.Integral(func, (var, lower, upper))
+            steps.append("⚙️ *Метод:* численная квадратура (mpmath)")
+            steps.append(f"⚠️ *Не удалось вычислить:* квадратура не сошлась (оценка погрешности `{integral['error_estimate']:.1e}`)")
+            steps.append("💡 *Интеграл, возможно, расходится*")
+        elif integral["method"] == "symbolic":
+            steps.append("⚙️ *Метод:* символьное интегрирование")
+            steps.append(f"💫 *Интеграл:* `{render(value)}`")
+            if value.is_number and not value.is_Rational and value.is_finite:
+                steps.append(f"🔢 *Приближенно:* `{sp.N(value, 10)}`")
+        else:
+            steps.append("⚙️ *Метод:* численная квадратура (mpmath)")
+            steps.append(f"💫 *Интеграл ≈* `{sp.N(value, 10)}`")
+            steps.append(f"📐 *Оценка погрешности:* `{integral['error_estimate']:.1e}`")
+        
+        return {
+            "success": True,
+            "result": value,
+            "steps": steps,
+            "type": "integral",
+            "method": integral["method"],
+            "converged": integral["value"] is not None,
+            "error_estimate": integral["error_estimate"]
+        }
+
+    def solve_advanced_equation(self, clean_expr: str, steps: list, deadline: float = None) -> dict:
+        """Решение уравнений с улучшенным пониманием"""
+        try:
+            x = symbols('x')
+            
+            if 'solve(' in clean_expr:
+                match = re.search(r'solve\(([^,]+),([^)]+)\)', clean_expr)
+                if match:
+                    eq_str = match.group(1).strip()
+                    var_str = match.group(2).strip()
+                    equation = self.safe_sympify(eq_str)
+                    var = self.safe_sympify(var_str) if var_str != 'x' else x
+                else:
+                    return {"success": False}
+            else:
+                # Пытаемся найти уравнение в тексте
+                if '=' in clean_expr:
+                    parts = clean_expr.split('=')
+                    if len(parts) == 2:
+                        left = self.safe_sympify(parts[0].strip())
+                        right = self.safe_sympify(parts[1].strip())
+                        equation = left - right
+                    else:
+                        return {"success": False}
+                else:
+                    equation = self.safe_sympify(clean_expr)
+                var = x
+            
+            if not equation:
+                return {"success": False}
+            
+            # Уравнение без x, но с одной другой переменной решаем относительно нее
+            if var not in equation.free_symbols and len(equation.free_symbols) == 1:
+                var = next(iter(equation.free_symbols))
+            
+            steps.append(f"📝 *Уравнение:* `{render(equation)} = 0`")
+            
+            solutions, exact, method = find_roots(equation, var, deadline)
+            
+            if solutions:
+                kind = "точные" if exact else "приближенные"
+                sign = "=" if exact else "≈"
+                steps.append(f"💡 *Найдено решений:* {len(solutions)} ({kind})")
+                for i, sol in enumerate(solutions, 1):
+                    steps.append(f"🔹 *{var}{i} {sign}* `{render(sol)}`")
+            else:
+                steps.append("❌ *Решений не найдено*")
+            
+            if method == "numeric":
+                steps.append(f"🔎 *Численный поиск на отрезке* `[-{SCAN_RANGE:g}; {SCAN_RANGE:g}]`")
+            
+            return {
+                "success": True,
+                "result": solutions,
+                "steps": steps,
+                "type": "equation",
+                "exact": exact,
+                "method": method
+            }
+        except Exception as e:
+            logger.error(f"solve_advanced_equation error: {e}")
+            return {"success": False, "error": str(e)}
+
+    def solve_advanced_limit(self, clean_expr: str, steps: list, deadline: float = None) -> dict:
+        """Пределы: символьно под бюджетом, иначе численная оценка слева и справа"""
+        try:
+            x = symbols('x')
+            
+            # limit(f, x, a) или после предобработки "limit f , x,a" ("предел f при x→a")
+            call = LIMIT_CALL_RE.search(clean_expr)
+            args = split_arguments(call.group(1) if call else COMMAND_WORDS_RE.sub(' ', clean_expr).strip())
+            if len(args) != 3:
+                return {"success": False}
+            func_str, var_str, point_str = args
+            func = self.safe_sympify(func_str)
+            var = self.safe_sympify(var_str) if var_str != 'x' else x
+            point = self.safe_sympify(point_str)
+            
+            if not func:
+                return {"success": False}
+            
+            steps.append(f"📊 *Функция:* `{render(func)}`")
+            steps.append(f"🎯 *Переменная:* `{var}`")
+            steps.append(f"📍 *Точка:* `{point}`")
+            
+            found = find_limit(func, var, point, deadline)
+            if found is None:
+                return {"success": False}
+            
+            lim = found["value"]
+            if found["method"] == "symbolic":
+                steps.append(f"💫 *Предел:* `{render(lim)}`")
+            else:
+                steps.append("⚙️ *Метод:* численная оценка на последовательностях слева и справа (mpmath)")
+                sides = found["sides"]
+                if len(sides) == 1 and point.is_finite:
+                    side = "справа" if "right" in sides else "слева"
+                    steps.append(f"📍 *Функция определена только {side} от точки*")
+                if lim is None:
+                    # Погрешность сравнима со значением: числа не показываем как ответ
+                    direction = "+-" if len(sides) == 2 else "+" if "right" in sides else "-"
+                    lim = sp.Limit(func, var, point, dir=direction)
+                    estimates = ", ".join(
+                        f"{'слева' if name == 'left' else 'справа'} `{render(value)}`" for name, value in sides.items()
+                    )
+                    steps.append(f"⚠️ *Предел не определен:* оценки не сходятся ({estimates})")
+                    steps.append("💡 *Значения колеблются или сходятся слишком медленно — предел, возможно, не существует*")
+                else:
+                    if found["mismatch"]:
+                        steps.append(
+                            f"⚠️ *Пределы различаются:* слева `{render(sides['left'])}`, справа `{render(sides['right'])}` "
+                            "— двусторонний предел не существует, ниже предел справа"
+                        )
+                    steps.append(f"💫 *Предел ≈* `{render(lim)}`")
+                    steps.append(f"📐 *Оценка погрешности:* `{found['error_estimate']:.1e}`, уверенность {found['confidence']}")
+                    if found["confidence"] == "низкая":
+                        steps.append("⚠️ *Значения не сходятся:* предел, возможно, не существует")
+            
+            return {
+                "success": True,
+                "result": lim,
+                "steps": steps,
+                "type": "limit",
+                "method": found["method"],
+                "error_estimate": found.get("error_estimate"),
+                "confidence": found.get("confidence"),
+                "mismatch": found.get("mismatch", False),
+                "undetermined": found["value"] is None
+            }
+        except Exception as e:
+            logger.error(f"solve_advanced_limit error: {e}")
+            return {"success": False, "error": str(e)}
+
+    def solve_factorization(self, clean_expr: str, steps: list) -> dict:
+        """Факторизация выражений"""
+        try:
+            expr = self.safe_sympify(clean_expr.replace('factor', '').strip())
+            if not expr:
+                return {"success": False}
+            
+            steps.append(f"📝 *Исходное:* `{render(expr)}`")
+            
+            factored = factor(expr)
+            steps.append(f"🧩 *Разложено:* `{render(factored)}`")
+            
+            return {
+                "success": True,
+                "result": factored,
+                "steps": steps,
+                "type": "factor"
+            }
+        except Exception as e:
+            logger.error(f"solve_factorization error: {e}")
+            return {"success": False, "error": str(e)}
+
+    def solve_expansion(self, clean_expr: str, steps: list) -> dict:
+        """Раскрытие скобок"""
+        try:
+            expr = self.safe_sympify(clean_expr.replace('expand', '').strip())
+            if not expr:
+                return {"success": False}
+            
+            steps.append(f"📝 *Исходное:* `{render(expr)}`")
+            
+            expanded = expand(expr)
+            steps.append(f"📤 *Раскрыто:* `{render(expanded)}`")
+            
+            return {
+                "success": True,
+                "result": expanded,
+                "steps": steps,
+                "type": "expand"
+            }
+        except Exception as e:
+            logger.error(f"solve_expansion error: {e}")
+            return {"success": False, "error": str(e)}
+
+# Решатель внутри процесса пула (создается при первом запросе)
+_WORKER_SOLVER = None
+
+def solve_in_worker(expression: str, on_step=None) -> dict:
+    """Точка входа для процессов-решателей"""
+    global _WORKER_SOLVER
+    if _WORKER_SOLVER is None:
+        _WORKER_SOLVER = MathSolver()
+    return _WORKER_SOLVER.solve_expression(expression, on_step=on_step)
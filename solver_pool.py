@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from memory import recycle_reason, rss_bytes
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать импорта sympy в новом процессе, прежде чем счесть его зависшим
+WORKER_STARTUP_TIMEOUT = float(os.getenv("WORKER_STARTUP_TIMEOUT", 60))
+
+
+class SolverTimeout(Exception):
+    """Решатель не уложился в отведённое время"""
+
+
+def _worker_main(conn, target):
+    """Цикл процесса-решателя: получает выражение, возвращает шаги и результат"""
+    conn.send("ready")
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        expression, stream = request
+        try:
+            if stream:
+                result = target(expression, lambda step: conn.send(("step", step)))
+            else:
+                result = target(expression)
+        except Exception as e:
+            logger.error(f"Worker error: {e}")
+            result = {"success": False, "error": str(e), "steps": []}
+        try:
+            conn.send(("result", result))
+        except Exception as e:
+            # Результат не сериализуется — отдаем ошибку, а не роняем процесс
+            logger.error(f"Worker send error: {e}")
+            conn.send(("result", {"success": False, "error": str(e), "steps": []}))
+
+
+class _Worker:
+    """Один процесс-решатель и канал связи с ним"""
+
+    def __init__(self, ctx, target, startup_timeout=WORKER_STARTUP_TIMEOUT):
+        self.ctx = ctx
+        self.target = target
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.conn = None
+        self.ready = False
+        self.tasks = 0
+        # Плановые перезапуски по причинам: tasks, rss
+        self.recycles = Counter()
+        # Процесс обслуживает один запрос за раз (общая очередь или свой шард)
+        self.lock = threading.Lock()
+
+    def start(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(target=_worker_main, args=(child_conn, self.target), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.ready = False
+        self.tasks = 0
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def restart(self):
+        self.kill()
+        self.start()
+
+    def rss(self):
+        if self.process is None or not self.process.is_alive():
+            return None
+        return rss_bytes(self.process.pid)
+
+    def recycle_if_needed(self):
+        """Плановый перезапуск: после WORKER_MAX_TASKS задач или при большом RSS.
+
+        Новый процесс импортирует sympy, пока ждет следующую задачу.
+        """
+        rss = self.rss()
+        reason = recycle_reason(self.tasks, rss)
+        if reason is None:
+            return
+        logger.info(f"♻️ Перезапуск решателя ({reason}): {self.tasks} задач, RSS {(rss or 0) / 2**20:.0f} МБ")
+        self.recycles[reason] += 1
+        self.stop()
+        self.start()
+
+    def call(self, expression, timeout, on_step=None):
+        """Решает выражение; по истечении timeout процесс убивается и перезапускается.
+
+        on_step(step) получает промежуточные шаги, пока решатель работает.
+        """
+        try:
+            if not self.ready:
+                # Первый запуск: ждем импорт sympy, он не входит в бюджет запроса
+                if not self.conn.poll(self.startup_timeout):
+                    logger.warning(f"⏱ Решатель не запустился за {self.startup_timeout} сек, перезапускаем процесс")
+                    self.restart()
+                    raise SolverTimeout(expression)
+                self.conn.recv()
+                self.ready = True
+            deadline = time.monotonic() + timeout
+            self.conn.send((expression, on_step is not None))
+            while self.conn.poll(max(0.0, deadline - time.monotonic())):
+                kind, payload = self.conn.recv()
+                if kind == "result":
+                    self.tasks += 1
+                    self.recycle_if_needed()
+                    return payload
+                on_step(payload)
+        except (EOFError, OSError) as e:
+            logger.error(f"Worker crashed: {e}")
+            self.restart()
+            raise
+        logger.warning(f"⏱ Решатель не уложился в {timeout} сек, перезапускаем процесс")
+        self.restart()
+        raise SolverTimeout(expression)
+
+
+class SolverPool:
+    """Ограниченный пул процессов-решателей с таймаутом на каждый запрос.
+
+    Запрос с shard идет в очередь своего процесса; если тот занят чужими
+    задачами, а другой процесс свободнее, — в очередь менее загруженного.
+    Пока у шарда есть задачи в работе, новые идут туда же: запросы одного
+    пользователя решаются по порядку.
+    """
+
+    def __init__(self, target, size=2, timeout=10.0, start_method="spawn"):
+        self.target = target
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.ctx = multiprocessing.get_context(start_method)
+        self.workers = []
+        self.idle = queue.Queue()
+        self.executor = None
+        self.shard_executors = []
+        # Задач в очереди каждого процесса и процесс шарда с задачами в работе (меняются только в event loop)
+        self.queued = []
+        self.shard_owners = {}
+
+    def start(self):
+        """Запуск процессов-решателей"""
+        for i in range(self.size):
+            worker = _Worker(self.ctx, self.target)
+            worker.start()
+            self.workers.append(worker)
+            self.idle.put(worker)
+            self.shard_executors.append(ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"solver-shard{i}"))
+        self.queued = [0] * self.size
+        self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="solver")
+        logger.info(f"🧵 Пул решателей запущен: {self.size} процессов, таймаут {self.timeout} сек")
+
+    def stop(self):
+        """Остановка всех процессов"""
+        for executor in [self.executor] + self.shard_executors:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self.shard_executors = []
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    def utilization(self) -> float:
+        """Доля занятых процессов"""
+        if not self.workers:
+            return 0.0
+        return sum(worker.lock.locked() for worker in self.workers) / len(self.workers)
+
+    def rss(self) -> dict:
+        """RSS каждого процесса в байтах: {номер: RSS}"""
+        usage = {str(index): worker.rss() for index, worker in enumerate(self.workers)}
+        return {index: value for index, value in usage.items() if value is not None}
+
+    def recycles(self) -> dict:
+        """Плановые перезапуски процессов по причинам"""
+        return dict(sum((worker.recycles for worker in self.workers), Counter()))
+
+    def _run(self, expression, timeout, on_step):
+        worker = self.idle.get()
+        try:
+            with worker.lock:
+                return worker.call(expression, timeout, on_step)
+        finally:
+            self.idle.put(worker)
+
+    def _pick(self, shard) -> int:
+        """Процесс для задачи шарда: тот же, что у его задач в работе, иначе свой или менее загруженный"""
+        owner = self.shard_owners.get(shard)
+        if owner is not None:
+            return owner[0]
+        preferred = hash(shard) % self.size
+        least = min(range(self.size), key=self.queued.__getitem__)
+        return least if self.queued[least] < self.queued[preferred] else preferred
+
+    def _run_shard(self, worker, expression, timeout, on_step):
+        with worker.lock:
+            return worker.call(expression, timeout, on_step)
+
+    async def solve(self, expression, timeout=None, on_step=None, shard=None):
+        """Решение выражения в свободном процессе без блокировки event loop.
+
+        on_step вызывается в event loop для каждого промежуточного шага;
+        shard (например, id пользователя) закрепляет запрос за процессом.
+        """
+        loop = asyncio.get_running_loop()
+        if on_step:
+            callback = on_step
+            on_step = lambda step: loop.call_soon_threadsafe(callback, step)
+        timeout = timeout if timeout is not None else self.timeout
+        if shard is None:
+            return await loop.run_in_executor(self.executor, self._run, expression, timeout, on_step)
+        index = self._pick(shard)
+        self.queued[index] += 1
+        owner = self.shard_owners.setdefault(shard, [index, 0])
+        owner[1] += 1
+        try:
+            return await loop.run_in_executor(
+                self.shard_executors[index], self._run_shard, self.workers[index], expression, timeout, on_step
+            )
+        finally:
+            self.queued[index] -= 1
+            owner[1] -= 1
+            if not owner[1]:
+                del self.shard_owners[shard]
@@ -0,0 +1,57 @@
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedSQLiteWriter:
+    """Фоновый поток записи в SQLite: строки из очереди пишутся пачками.
+
+    connect() открывает соединение уже в потоке записи; write(conn, rows)
+    записывает пачку (не больше batch_size строк) в одной транзакции.
+    """
+
+    def __init__(self, connect, write, batch_size=100, name="sqlite-writer"):
+        self.connect = connect
+        self.write = write
+        self.batch_size = batch_size
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self._write_loop, name=name, daemon=True)
+        self.thread.start()
+
+    def put(self, row):
+        """Строка ставится в очередь и не ждет диска"""
+        self.pending.put(row)
+
+    def flush(self):
+        """Дождаться записи всех поставленных в очередь строк"""
+        self.pending.join()
+
+    def close(self):
+        """Записать остаток очереди и остановить поток"""
+        self.pending.put(None)
+        self.thread.join()
+
+    def _write_loop(self):
+        conn = self.connect()
+        while True:
+            batch = [self.pending.get()]
+            # Добираем пачку, пока очередь не опустеет
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not None]
+            try:
+                if rows:
+                    self.write(conn, rows)
+            except Exception as e:
+                logger.error(f"SQLite write error ({self.thread.name}): {e}")
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+            if batch[-1] is None:
+                break
+        conn.close()
@@ -0,0 +1,71 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class StageTimings:
+    """Собственное время этапов запроса (вложенный этап не учитывается во внешнем)"""
+
+    def __init__(self):
+        self.totals = {}
+        self.stack = []
+
+    def enter(self, name: str):
+        now = time.perf_counter()
+        if self.stack:
+            parent, started = self.stack[-1]
+            self.totals[parent] = self.totals.get(parent, 0.0) + now - started
+        self.stack.append((name, now))
+
+    def exit(self):
+        now = time.perf_counter()
+        name, started = self.stack.pop()
+        self.totals[name] = self.totals.get(name, 0.0) + now - started
+        if self.stack:
+            # Внешний этап продолжается с текущего момента
+            self.stack[-1] = (self.stack[-1][0], now)
+
+    def as_dict(self) -> dict:
+        return dict(self.totals)
+
+
+@contextmanager
+def request():
+    """Замер этапов запроса; вложенный вызов использует внешний замер"""
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        yield timings
+        return
+    timings = _local.timings = StageTimings()
+    try:
+        yield timings
+    finally:
+        _local.timings = None
+
+
+@contextmanager
+def stage(name: str):
+    """Этап запроса; вне request() ничего не замеряет"""
+    timings = getattr(_local, "timings", None)
+    if timings is None:
+        yield
+        return
+    timings.enter(name)
+    try:
+        yield
+    finally:
+        timings.exit()
+
+
+def timed(name: str):
+    """Декоратор: весь вызов функции — этап name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,31 @@
+import time
+
+import sympy as sp
+
+from canonical import _unwrap, canonical_key, rename_result
+
+
+def test_trailing_differential_shares_key_across_variables():
+    key_x, names_x = canonical_key('integrate 3x**2 + 2x - 1 dx', 'integral')
+    key_y, names_y = canonical_key('integrate 3y**2 + 2y - 1 dy', 'integral')
+    assert key_x[0] != "text"
+    assert key_x == key_y
+    x, y = sp.symbols('x y')
+    assert rename_result(x ** 3 + x ** 2 - x, names_x, names_y) == y ** 3 + y ** 2 - y
+
+
+def test_differential_variable_is_not_confused_with_x():
+    key_dy, names_dy = canonical_key('integrate x*y dy', 'integral')
+    key_dx, names_dx = canonical_key('integrate y*x dx', 'integral')
+    assert key_dy == key_dx
+    x, y = sp.symbols('x y')
+    # ∫ x·y dy = x·y²/2 переносится в ∫ y·x dx = y·x²/2
+    assert rename_result(x * y ** 2 / 2, names_dy, names_dx) == y * x ** 2 / 2
+
+
+def test_unwrap_deep_nesting_is_linear():
+    text = '(' * 2000 + 'x' + ')' * 2000
+    started = time.perf_counter()
+    assert _unwrap(text) == 'x'
+    assert time.perf_counter() - started < 0.1
+    assert _unwrap('(a) + (b)') == '(a) + (b)'
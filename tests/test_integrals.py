@@ -0,0 +1,34 @@
+import time
+
+import sympy as sp
+
+from integrals import definite_integral
+
+x = sp.Symbol('x')
+
+
+def numeric(func, low, high):
+    # Дедлайн уже наступил: символьный бюджет нулевой, сразу квадратура
+    return definite_integral(func, x, sp.sympify(low), sp.sympify(high), deadline=time.monotonic())
+
+
+def test_numeric_convergent():
+    result = numeric(sp.exp(-x ** 2), -sp.oo, sp.oo)
+    assert result["method"] == "numeric"
+    assert abs(result["value"] - sp.sqrt(sp.pi).evalf()) < 1e-10
+
+
+def test_numeric_divergent_is_not_a_number():
+    result = numeric(1 / x, 1, sp.oo)
+    assert result["value"] is None
+
+
+def test_numeric_oscillatory_improper_is_not_a_number():
+    # ∫₀^∞ sin(x)/x = π/2, но квадратура дает 0.900 с погрешностью 1
+    result = numeric(sp.sin(x) / x, 0, sp.oo)
+    assert result["value"] is None
+
+
+def test_numeric_oscillatory_finite_interval_is_split():
+    result = numeric(sp.sin(x) ** 2, 0, 100)
+    assert abs(result["value"] - (50 - sp.sin(200) / 4).evalf()) < 1e-8
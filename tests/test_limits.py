@@ -0,0 +1,21 @@
+import sympy as sp
+
+from limits import numeric_limit
+
+x = sp.Symbol('x')
+
+
+def test_slow_logarithmic_divergence():
+    assert numeric_limit(sp.log(x), x, sp.Integer(0))["value"] == -sp.oo
+    assert numeric_limit(sp.log(x), x, sp.oo)["value"] == sp.oo
+
+
+def test_oscillating_limit_is_undetermined():
+    result = numeric_limit(sp.sin(1 / x), x, sp.Integer(0))
+    assert result["value"] is None
+    assert set(result["sides"]) == {"left", "right"}
+
+
+def test_convergent_limits_still_found():
+    assert abs(numeric_limit(sp.sin(x) / x, x, sp.Integer(0))["value"] - 1) < 1e-10
+    assert numeric_limit(x * sp.log(x), x, sp.Integer(0))["value"] == 0
@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from scheduler import Overloaded, SolveScheduler
+
+
+def test_overload_does_not_spend_user_tokens():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def solve(expression, on_step, user_id):
+            await release.wait()
+            return expression
+
+        scheduler = SolveScheduler(solve, concurrency=1, max_queue=1, user_rate=0, user_burst=2)
+        busy = asyncio.ensure_future(scheduler.submit("other", "general", "a"))
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(scheduler.submit("other", "general", "b"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await scheduler.submit("user", "general", "c")
+        assert scheduler.buckets.get("user") is None or scheduler.buckets["user"].tokens == 2
+        release.set()
+        await asyncio.gather(busy, queued)
+        await scheduler.shutdown()
+
+    asyncio.run(scenario())
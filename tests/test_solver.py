@@ -0,0 +1,15 @@
+import sympy as sp
+
+from solver import MathSolver
+
+x = sp.Symbol('x')
+
+
+def test_help_example_exp_superscript_integral():
+    result = MathSolver().solve_expression("интеграл от eˣ × sin(x) dx")
+    assert result["success"]
+    assert sp.simplify(result["result"] - sp.exp(x) * (sp.sin(x) - sp.cos(x)) / 2) == 0
+
+
+def test_multi_digit_superscript():
+    assert MathSolver().smart_preprocess("x¹⁰ - 1") == "x**(10) - 1"
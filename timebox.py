@@ -0,0 +1,43 @@
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+
+class BudgetExceeded(BaseException):
+    """Символьная попытка не уложилась в бюджет.
+
+    Наследуется от BaseException, чтобы sympy не проглотил его в своих except Exception.
+    """
+
+
+@contextmanager
+def time_limit(seconds: float):
+    """Прерывает блок по SIGALRM; вне главного потока ограничение не ставится"""
+    if seconds <= 0:
+        raise BudgetExceeded()
+    if threading.current_thread() is not threading.main_thread() or not hasattr(signal, "setitimer"):
+        # Inline-режим бота: поток прервать нельзя, остается внешний таймаут
+        yield
+        return
+
+    def _alarm(signum, frame):
+        raise BudgetExceeded()
+
+    previous = signal.signal(signal.SIGALRM, _alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def share_of_remaining(deadline: float, cap: float, fraction: float = 0.5) -> float:
+    """Бюджет символьной попытки: не больше cap и доли fraction от остатка до deadline.
+
+    Остаток после символьной попытки уходит на численный запасной путь.
+    """
+    if deadline is None:
+        return cap
+    return min(cap, (deadline - time.monotonic()) * fraction)
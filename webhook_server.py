@@ -0,0 +1,76 @@
+import asyncio
+import json
+import logging
+import signal
+
+import tornado.web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramWebhookHandler(tornado.web.RequestHandler):
+    """Прием обновлений Telegram и передача их в очередь Application"""
+
+    def initialize(self, telegram_app, secret_token):
+        # self.application занят самим tornado
+        self.telegram_app = telegram_app
+        self.secret_token = secret_token
+
+    async def post(self):
+        if self.secret_token and self.request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret_token:
+            raise tornado.web.HTTPError(403)
+        try:
+            update = Update.de_json(json.loads(self.request.body), self.telegram_app.bot)
+        except Exception as e:
+            logger.error(f"Webhook parse error: {e}")
+            raise tornado.web.HTTPError(400)
+        await self.telegram_app.update_queue.put(update)
+        self.set_status(200)
+
+
+class ViewHandler(tornado.web.RequestHandler):
+    """Обычный GET-маршрут в формате Flask: строка, словарь (JSON) или (тело, код, заголовки)"""
+
+    def initialize(self, view):
+        self.view = view
+
+    def get(self):
+        response = self.view()
+        if isinstance(response, tuple):
+            response, status, headers = response
+            self.set_status(status)
+            for name, value in headers.items():
+                self.set_header(name, value)
+        self.write(response)
+
+
+def make_web_app(application, url_path, secret_token, views):
+    """Tornado-приложение: вебхук Telegram и служебные маршруты"""
+    handlers = [(f"/{url_path}", TelegramWebhookHandler, {"telegram_app": application, "secret_token": secret_token})]
+    handlers += [(path, ViewHandler, {"view": view}) for path, view in views.items()]
+    return tornado.web.Application(handlers)
+
+
+async def serve_webhook(application, views, port, url_path, webhook_url, secret_token=None, background=()):
+    """Один event loop: вебхук, /health, /ping и обработка обновлений"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    web_app = make_web_app(application, url_path, secret_token, views)
+    async with application:
+        await application.start()
+        server = web_app.listen(port, address="0.0.0.0")
+        await application.bot.set_webhook(webhook_url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+        logger.info(f"🌐 Вебхук слушает порт {port}: {webhook_url}")
+
+        tasks = [asyncio.create_task(coro) for coro in background]
+        try:
+            await stop_event.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            server.stop()
+            await application.stop()